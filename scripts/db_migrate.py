@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+__author__ = "Mathtin"
+
+"""
+Database schema migration tool
+
+Usage: python scripts/db_migrate.py [version]
+
+Upgrades (or downgrades) database from DATABASE_ACCESS_URL to given version,
+HEAD by default. Prints current version when it is already there.
+"""
+
+import logging
+import os
+import sys
+from typing import List
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('RESOURCE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'res'))
+
+from db.migrations import HEAD, current_version, downgrade, migrate
+from db.models.base import Base
+
+log = logging.getLogger('db-migrate')
+
+
+def main(argv: List[str]) -> None:
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    load_dotenv()
+    url = os.getenv('DATABASE_ACCESS_URL').replace('+asyncpg', '').replace('+aiosqlite', '')
+    target = int(argv[1]) if len(argv) > 1 else HEAD
+    engine = create_engine(url)
+    if target >= HEAD:
+        migrate(engine, Base.metadata)
+    else:
+        downgrade(engine, target)
+    with engine.connect() as conn:
+        log.info(f'Database schema version: {current_version(conn)}')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -28,5 +28,6 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+from .config import DatabaseConfig
 from .session import DBConnection
 from .models import *
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from util import ConfigView
+
+
+class DatabaseConfig(ConfigView):
+    """
+    database {
+        pool_size = ...
+        max_overflow = ...
+        pool_timeout = ...
+        pool_recycle = ...
+        pool_pre_ping = ...
+        statement_timeout = ...
+        executor_workers = ...
+        write_behind = ...
+        write_behind_size = ...
+        write_behind_delay = ...
+    }
+
+    Applied on startup only
+    """
+    pool_size: int = 5
+    max_overflow: int = 10
+    # Seconds to wait for free connection
+    pool_timeout: int = 30
+    # Seconds before connection is recycled (-1 disables)
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # Milliseconds (0 disables)
+    statement_timeout: int = 0
+    # Threads serving sync-wrapped sessions (sqlite)
+    executor_workers: int = 4
+    # Queue high-frequency writes and flush them in grouped transactions
+    write_behind: bool = False
+    # Pending writes triggering flush
+    write_behind_size: int = 500
+    # Seconds before pending writes are flushed
+    write_behind_delay: float = 1.0
@@ -29,7 +29,7 @@ SOFTWARE.
 __author__ = "Mathtin"
 
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
 
 import discord as d
 
@@ -57,12 +57,38 @@ def roles_to_rows(roles: List[d.Role]) -> List[Dict[str, Any]]:
     return rows
 
 
-def role_mask(user: d.Member, role_map: Dict[int, Dict[str, Any]]) -> str:
-    mask = ['0'] * len(role_map)
-    for role in user.roles:
-        idx = role_map[role.id]['idx']
-        mask[idx] = '1'
-    return ''.join(mask)
+def encode_role_mask(indexes: Iterable[int]) -> bytes:
+    """
+        Encodes role indexes as bitset (bit i%8 of byte i//8)
+    """
+    mask = bytearray()
+    for idx in indexes:
+        if idx // 8 >= len(mask):
+            mask.extend(b'\x00' * (idx // 8 - len(mask) + 1))
+        mask[idx // 8] |= 1 << (idx % 8)
+    return bytes(mask)
+
+
+def decode_role_mask(mask: Optional[bytes]) -> List[int]:
+    if not mask:
+        return []
+    return [i * 8 + bit for i, byte in enumerate(mask) for bit in range(8) if byte & (1 << bit)]
+
+
+def clear_role_mask_bit(mask: bytes, idx: int) -> bytes:
+    if idx // 8 >= len(mask):
+        return mask
+    mask = bytearray(mask)
+    mask[idx // 8] &= ~(1 << (idx % 8)) & 0xFF
+    return bytes(mask)
+
+
+def role_mask(user: d.Member, role_map: Dict[int, Dict[str, Any]]) -> bytes:
+    return encode_role_mask(role_map[role.id]['idx'] for role in user.roles)
+
+
+def user_role_rows(user: d.Member) -> List[Dict[str, Any]]:
+    return [{'user_did': user.id, 'role_did': role.id} for role in user.roles]
 
 
 #
@@ -111,3 +137,16 @@ def persistent_player_profile_row(user: User, player: PlayerData) -> Dict[str, A
         'uuid': str(player.uuid),
         'persistent': True
     }
+
+
+#
+# Player name cache
+#
+
+def player_name_cache_row(name: str, player: PlayerData, expires_at: int) -> Dict[str, Any]:
+    return {
+        'name': name,
+        'ign': player.username if player.valid else None,
+        'uuid': str(player.uuid) if player.valid else None,
+        'expires_at': expires_at
+    }
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from sqlalchemy import Column, Integer, TIMESTAMP, Table
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import MetaData
+from sqlalchemy.sql.functions import now
+
+
+def model_table(name: str, metadata: MetaData, *args, **kwargs) -> Table:
+    """
+        Table definition with BaseModel columns (id, created_at, updated_at)
+
+        Migrations define their tables explicitly so later model changes do not alter old steps
+    """
+    return Table(name, metadata,
+                 Column('id', Integer, nullable=False, unique=True, primary_key=True, autoincrement=True),
+                 Column('created_at', TIMESTAMP(True), nullable=False, server_default=now()),
+                 Column('updated_at', TIMESTAMP(True), nullable=False, server_default=now(), onupdate=now()),
+                 *args, **kwargs)
+
+
+class Migration(object):
+    """
+        Single reversible schema step
+
+        upgrade brings schema from version - 1 to version, downgrade reverts it
+    """
+    version: int
+    description: str
+
+    def upgrade(self, conn: Connection) -> None:
+        raise NotImplementedError()
+
+    def downgrade(self, conn: Connection) -> None:
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return f'<Migration({self.version:04d} {self.description})>'
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from sqlalchemy import Column, Unicode, VARCHAR, BigInteger
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import MetaData
+
+from .base import Migration, model_table
+
+metadata = MetaData()
+
+player_name_cache = model_table('player_name_cache', metadata,
+                                Column('name', Unicode(127), nullable=False, unique=True),
+                                Column('ign', Unicode(127), nullable=True),
+                                Column('uuid', VARCHAR(63), nullable=True),
+                                Column('expires_at', BigInteger, nullable=False))
+
+
+class PlayerNameCacheMigration(Migration):
+    version = 1
+    description = 'player name cache table'
+
+    def upgrade(self, conn: Connection) -> None:
+        player_name_cache.create(conn, checkfirst=True)
+
+    def downgrade(self, conn: Connection) -> None:
+        player_name_cache.drop(conn, checkfirst=True)
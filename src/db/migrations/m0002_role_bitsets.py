@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from typing import Any, Dict, List
+
+from sqlalchemy import Column, BigInteger, Index, LargeBinary, String, UniqueConstraint, VARCHAR, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import MetaData
+
+from ..converters import encode_role_mask, decode_role_mask
+from .base import Migration, model_table
+
+metadata = MetaData()
+
+user_roles = model_table('user_roles', metadata,
+                         Column('user_did', BigInteger, nullable=False),
+                         Column('role_did', BigInteger, nullable=False),
+                         UniqueConstraint('role_did', 'user_did'),
+                         Index('ix_user_roles_user_did', 'user_did'))
+
+
+def _alter_roles_type(conn: Connection, roles_type) -> None:
+    # Column type is not altered in sqlite (dynamic typing)
+    type_name = roles_type.compile(dialect=conn.dialect)
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f'ALTER TABLE users ALTER COLUMN roles TYPE {type_name} USING NULL'))
+    elif conn.dialect.name == 'mysql':
+        conn.execute(text(f'ALTER TABLE users MODIFY roles {type_name} NULL'))
+
+
+def _has_legacy_role_masks(conn: Connection) -> bool:
+    columns = {c['name']: c for c in inspect(conn).get_columns('users')}
+    if not isinstance(columns['roles']['type'], String):
+        return False
+    if conn.dialect.name == 'sqlite':
+        return conn.execute(text("SELECT 1 FROM users WHERE typeof(roles) = 'text' LIMIT 1")).first() is not None
+    return True
+
+
+def _update_masks(conn: Connection, masks: List[Dict[str, Any]]) -> None:
+    if masks:
+        conn.execute(text('UPDATE users SET roles = :roles WHERE did = :b_did'), masks)
+
+
+class RoleBitsetMigration(Migration):
+    """
+        Converts '0'/'1' string role masks to bitsets and fills user_roles association table
+    """
+    version = 2
+    description = 'role mask bitsets and user roles table'
+
+    def upgrade(self, conn: Connection) -> None:
+        user_roles.create(conn, checkfirst=True)
+        # Tables created by unversioned builds may already be converted
+        if not _has_legacy_role_masks(conn):
+            return
+        legacy = conn.execute(text('SELECT did, roles FROM users WHERE roles IS NOT NULL')).all()
+        _alter_roles_type(conn, LargeBinary(32))
+        idx_did_map = {idx: did for did, idx in conn.execute(text('SELECT did, idx FROM roles'))}
+        masks = []
+        rows = []
+        for did, roles in legacy:
+            indexes = [i for i, c in enumerate(roles) if c == '1']
+            masks.append({'b_did': did, 'roles': encode_role_mask(indexes)})
+            rows += [{'user_did': did, 'role_did': idx_did_map[i]} for i in indexes if i in idx_did_map]
+        _update_masks(conn, masks)
+        if rows:
+            conn.execute(user_roles.insert(), rows)
+
+    def downgrade(self, conn: Connection) -> None:
+        current = conn.execute(text('SELECT did, roles FROM users WHERE roles IS NOT NULL')).all()
+        _alter_roles_type(conn, VARCHAR(127))
+        role_count = conn.execute(text('SELECT count(*) FROM roles')).scalar()
+        masks = []
+        for did, roles in current:
+            mask = ['0'] * role_count
+            for idx in decode_role_mask(roles):
+                if idx < role_count:
+                    mask[idx] = '1'
+            masks.append({'b_did': did, 'roles': ''.join(mask)})
+        _update_masks(conn, masks)
+        user_roles.drop(conn, checkfirst=True)
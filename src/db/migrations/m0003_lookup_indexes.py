@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from sqlalchemy import Column, Integer, BigInteger, Unicode, BOOLEAN, Index, Table, false, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import MetaData
+
+from .base import Migration
+
+metadata = MetaData()
+
+# Partial table definitions, only indexed columns are required
+users = Table('users', metadata,
+              Column('name', Unicode(127)),
+              Column('disc', Integer),
+              Column('display_name', Unicode(127)))
+player_profiles = Table('player_profiles', metadata,
+                        Column('user_id', Integer),
+                        Column('banned', BOOLEAN),
+                        Column('message_did', BigInteger))
+player_name_cache = Table('player_name_cache', metadata,
+                          Column('expires_at', BigInteger))
+
+INDEXES = [
+    Index('ix_users_display_name', users.c.display_name),
+    Index('ix_users_name_disc', users.c.name, users.c.disc),
+    Index('ix_player_profiles_message_did', player_profiles.c.message_did),
+    Index('ix_player_profiles_whitelisted', player_profiles.c.user_id,
+          postgresql_where=player_profiles.c.banned == false(),
+          sqlite_where=player_profiles.c.banned == false()),
+    Index('ix_player_name_cache_expires_at', player_name_cache.c.expires_at),
+]
+
+
+def _existing_indexes(conn: Connection, table: Table):
+    return {index['name'] for index in inspect(conn).get_indexes(table.name)}
+
+
+class LookupIndexesMigration(Migration):
+    version = 3
+    description = 'hot lookup column indexes'
+
+    def upgrade(self, conn: Connection) -> None:
+        for index in INDEXES:
+            if index.name not in _existing_indexes(conn, index.table):
+                index.create(conn)
+
+    def downgrade(self, conn: Connection) -> None:
+        for index in INDEXES:
+            if index.name in _existing_indexes(conn, index.table):
+                index.drop(conn)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+from logging import getLogger
+from typing import List, Optional
+
+from sqlalchemy import Column, Integer, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import MetaData
+
+from util.exceptions import SchemaVersionException
+from .base import Migration
+from .m0001_player_name_cache import PlayerNameCacheMigration
+from .m0002_role_bitsets import RoleBitsetMigration
+from .m0003_lookup_indexes import LookupIndexesMigration
+
+log = getLogger('db')
+
+# Ordered by version, new steps are appended here
+MIGRATIONS: List[Migration] = [
+    PlayerNameCacheMigration(),
+    RoleBitsetMigration(),
+    LookupIndexesMigration(),
+]
+HEAD = MIGRATIONS[-1].version
+
+version_metadata = MetaData()
+schema_version = Table('schema_version', version_metadata,
+                       Column('version', Integer, nullable=False))
+
+
+def current_version(conn: Connection) -> Optional[int]:
+    """
+        Applied schema version, None for unversioned database
+    """
+    if not inspect(conn).has_table(schema_version.name):
+        return None
+    return conn.execute(select(schema_version.c.version)).scalar()
+
+
+def _stamp(conn: Connection, version: int) -> None:
+    if current_version(conn) is None:
+        schema_version.create(conn, checkfirst=True)
+        conn.execute(schema_version.insert().values(version=version))
+    else:
+        conn.execute(schema_version.update().values(version=version))
+
+
+def migrate(engine: Engine, metadata: MetaData) -> None:
+    """
+        Brings database schema up to HEAD
+
+        Fresh database is created from models and stamped with HEAD, databases
+        created before versioning are treated as version 0 (initial schema)
+    """
+    with engine.begin() as conn:
+        version = current_version(conn)
+        if version is None:
+            if not inspect(conn).has_table('users'):
+                log.info(f'Creating database schema version {HEAD}')
+                metadata.create_all(conn)
+                _stamp(conn, HEAD)
+                return
+            version = 0
+            _stamp(conn, version)
+        if version > HEAD:
+            raise SchemaVersionException(version, HEAD)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        # Each step is applied in its own transaction
+        with engine.begin() as conn:
+            log.info(f'Applying migration {migration.version:04d}: {migration.description}')
+            migration.upgrade(conn)
+            _stamp(conn, migration.version)
+
+
+def downgrade(engine: Engine, target: int) -> None:
+    """
+        Reverts applied migrations down to target version
+    """
+    with engine.begin() as conn:
+        version = current_version(conn) or 0
+    for migration in reversed(MIGRATIONS):
+        if migration.version <= target or migration.version > version:
+            continue
+        with engine.begin() as conn:
+            log.info(f'Reverting migration {migration.version:04d}: {migration.description}')
+            migration.downgrade(conn)
+            _stamp(conn, migration.version - 1)
@@ -32,5 +32,7 @@ from .role import Role
 from .user import User
 from .playerprofile import PlayerProfile
 from .rank import Rank
+from .playernamecache import PlayerNameCache
+from .userrole import UserRole
 
-RELATION_MODELS = [Role, User, PlayerProfile, Rank]
+RELATION_MODELS = [Role, User, PlayerProfile, Rank, PlayerNameCache, UserRole]
@@ -28,7 +28,7 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
-from sqlalchemy import ForeignKey, Column, Integer, Unicode, BOOLEAN, BigInteger, VARCHAR
+from sqlalchemy import ForeignKey, Column, Integer, Unicode, BOOLEAN, BigInteger, VARCHAR, Index, false
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
@@ -41,12 +41,19 @@ class PlayerProfile(BaseModel):
     persistent = Column(BOOLEAN, nullable=False, default=False)
     banned = Column(BOOLEAN, nullable=False, default=False)
     profile = Column(Unicode(1000), nullable=True)
-    message_did = Column(BigInteger, nullable=True)
+    message_did = Column(BigInteger, nullable=True, index=True)
 
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
 
     user = relationship("User", lazy="joined")
 
+    # Whitelisted profiles only (plain index on dialects without partial index support)
+    __table_args__ = (
+        Index('ix_player_profiles_whitelisted', 'user_id',
+              postgresql_where=banned == false(),
+              sqlite_where=banned == false()),
+    )
+
     def __repr__(self):
         s = super().__repr__()[:-2]
         f = "user_id={0.user_id!r},ign={0.ign!r},persistent={0.persistent!r},banned={0.banned!r}".format(self)
@@ -28,18 +28,22 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
-from sqlalchemy import Column, Integer, VARCHAR, BigInteger, Unicode
+from sqlalchemy import Column, Integer, BigInteger, Unicode, LargeBinary, Index
 from .base import BaseModel
 
 
 class User(BaseModel):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_name_disc', 'name', 'disc'),
+    )
 
     did = Column(BigInteger, nullable=False, unique=True)
     name = Column(Unicode(127), nullable=False)
     disc = Column(Integer, nullable=False)
-    display_name = Column(Unicode(127), nullable=True)
-    roles = Column(VARCHAR(127), nullable=True)
+    display_name = Column(Unicode(127), nullable=True, index=True)
+    # Role bitset (see db.converters.encode_role_mask)
+    roles = Column(LargeBinary(32), nullable=True)
 
     def __repr__(self):
         s = super().__repr__()[:-2]
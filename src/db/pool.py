@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import time
+from typing import Any, Dict
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+class PoolStats(object):
+    checkouts: int
+    timeouts: int
+    wait_total: float
+    wait_max: float
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class _TimedPoolMixin(object):
+    """
+        Measures time spent waiting for pooled connection on checkout
+    """
+
+    stats: PoolStats
+
+    def _do_get(self) -> Any:
+        start = time.monotonic()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.monotonic() - start, timed_out=True)
+            raise
+        self.stats.record(time.monotonic() - start)
+        return conn
+
+    def status_dict(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'max_overflow': self._max_overflow,
+            'checkouts': stats.checkouts,
+            'timeouts': stats.timeouts,
+            'avg_wait': stats.wait_total / stats.checkouts if stats.checkouts else 0.0,
+            'max_wait': stats.wait_max,
+        }
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
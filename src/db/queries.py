@@ -28,10 +28,11 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
-from typing import Type
+from typing import Any, List, Type
 
-from sqlalchemy.sql import Select, Update, Delete, not_
-from sqlalchemy.sql.expression import delete
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.sql import Select, Insert, Update, Delete, not_, or_
+from sqlalchemy.sql.expression import bindparam, delete, insert
 from sqlalchemy.sql.expression import select, update
 
 from .models import *
@@ -50,6 +51,23 @@ def select_user_by_did(did: int) -> Select:
     return select(User).where(User.did == did)
 
 
+def select_users_by_dids(dids: List[int]) -> Select:
+    return select(User).where(User.did.in_(dids))
+
+
+def select_users_with_role(role_did: int) -> Select:
+    return select(User).join(UserRole, UserRole.user_did == User.did).where(UserRole.role_did == role_did)
+
+
+def select_user_masks_with_role(role_did: int) -> Select:
+    return select(User.did, User.roles).join(UserRole, UserRole.user_did == User.did) \
+        .where(UserRole.role_did == role_did)
+
+
+def select_present_user_dids() -> Select:
+    return select(User.did).where(or_(User.roles.is_not(None), User.display_name.is_not(None)))
+
+
 def select_user_by_display_name(display_name: str) -> Select:
     return select(User).where(User.display_name == display_name)
 
@@ -71,7 +89,15 @@ def select_player_profiles_by_did(did: int) -> Select:
 
 
 def select_player_profiles_by_did_whitelisted(did: int) -> Select:
-    return select(PlayerProfile).join(User).where(User.did == did and not_(PlayerProfile.banned))
+    return select(PlayerProfile).join(User).where(User.did == did, not_(PlayerProfile.banned))
+
+
+def select_player_profiles_persistent() -> Select:
+    return select(PlayerProfile).where(PlayerProfile.persistent == True)
+
+
+def select_player_profile_uuids_persistent() -> Select:
+    return select(PlayerProfile.uuid).where(PlayerProfile.persistent == True)
 
 
 def select_player_profile_by_ign(ign: str) -> Select:
@@ -86,17 +112,89 @@ def select_player_profile_by_message_did(did: int) -> Select:
     return select(PlayerProfile).where(PlayerProfile.message_did == did)
 
 
+def select_player_name_cache(name: str) -> Select:
+    return select(PlayerNameCache).where(PlayerNameCache.name == name)
+
+
+def select_player_name_cache_by_names(names: List[str]) -> Select:
+    return select(PlayerNameCache).where(PlayerNameCache.name.in_(names))
+
+
+def select_columns(model_type: Type[BaseModel], cols: List[str]) -> Select:
+    table = model_type.__table__
+    return select(*[table.c[col] for col in cols])
+
+
 ##################
 # INSERT QUERIES #
 ##################
 
-#
+def insert_player_profiles() -> Insert:
+    return insert(PlayerProfile.__table__)
+
+
+def insert_user_roles() -> Insert:
+    return insert(UserRole.__table__)
+
+
+def insert_all(model_type: Type[BaseModel]) -> Insert:
+    return insert(model_type.__table__)
+
+
+def upsert(model_type: Type[BaseModel], dialect: str, key_col: str, cols: List[str]) -> Insert:
+    """
+        Executemany-ready insert updating cols on key_col conflict
+
+        Falls back to plain insert for dialects without upsert support
+    """
+    table = model_type.__table__
+    update_cols = [col for col in cols if col != key_col]
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table)
+        if not update_cols:
+            return stmt.on_conflict_do_nothing(index_elements=[key_col])
+        return stmt.on_conflict_do_update(index_elements=[key_col],
+                                          set_={table.c[col]: stmt.excluded[col] for col in update_cols})
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({table.c[col]: stmt.inserted[col] for col in (update_cols or [key_col])})
+    return insert(table)
 
 
 ##################
 # UPDATE QUERIES #
 ##################
 
+def update_player_profiles_by_uuid() -> Update:
+    """
+        Executemany-ready update, expects b_uuid, ign, profile and message_did params
+    """
+    table = PlayerProfile.__table__
+    return update(table) \
+        .where(table.c.uuid == bindparam('b_uuid')) \
+        .values(ign=bindparam('ign'), profile=bindparam('profile'), message_did=bindparam('message_did'))
+
+
+def update_by_key(model_type: Type[BaseModel], key_col: str, cols: List[str]) -> Update:
+    """
+        Executemany-ready update, expects b_<key_col> param and cols params
+    """
+    table = model_type.__table__
+    return update(table) \
+        .where(table.c[key_col] == bindparam(f'b_{key_col}')) \
+        .values({col: bindparam(col) for col in cols})
+
+
+def update_user_roles_by_did() -> Update:
+    """
+        Executemany-ready update, expects b_did and roles params
+    """
+    table = User.__table__
+    return update(table) \
+        .where(table.c.did == bindparam('b_did')) \
+        .values(roles=bindparam('roles'))
+
+
 def update_all_users_absent() -> Update:
     return update(User) \
         .values(roles=None, display_name=None)
@@ -114,10 +212,34 @@ def update_user_absent_by_did(did: int) -> Update:
         .where(User.did == did)
 
 
+def update_users_absent_by_dids(dids: List[int]) -> Update:
+    return update(User) \
+        .values(roles=None, display_name=None) \
+        .where(User.did.in_(dids))
+
+
 ##################
 # DELETE QUERIES #
 ##################
 
+def delete_role_by_did(did: int) -> Delete:
+    return delete(Role).where(Role.did == did)
+
+
+def delete_user_roles_by_dids(dids: List[int]) -> Delete:
+    return delete(UserRole).where(UserRole.user_did.in_(dids))
+
+
+def delete_user_roles_by_role(role_did: int) -> Delete:
+    return delete(UserRole).where(UserRole.role_did == role_did)
+
+
+def delete_absent_user_roles() -> Delete:
+    return delete(UserRole) \
+        .where(UserRole.user_did.in_(select(User.did).where(User.roles.is_(None), User.display_name.is_(None)))) \
+        .execution_options(synchronize_session=False)
+
+
 def delete_absent_users() -> Delete:
     return delete(User) \
         .where(User.roles.is_(None), User.display_name.is_(None))
@@ -127,5 +249,20 @@ def delete_dynamic_profiles() -> Delete:
         .where(PlayerProfile.persistent == False)
 
 
+def delete_expired_player_name_cache(timestamp: int) -> Delete:
+    return delete(PlayerNameCache) \
+        .where(PlayerNameCache.expires_at <= timestamp)
+
+
+def delete_not_in(model_type: Type[BaseModel], key_col: str, keys: List[Any]) -> Delete:
+    table = model_type.__table__
+    return delete(table).where(table.c[key_col].not_in(keys))
+
+
+def delete_by_keys(model_type: Type[BaseModel], key_col: str, keys: List[Any]) -> Delete:
+    table = model_type.__table__
+    return delete(table).where(table.c[key_col].in_(keys))
+
+
 def delete_all(model_type: Type[BaseModel]) -> Delete:
     return delete(model_type)
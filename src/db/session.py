@@ -29,21 +29,172 @@ SOFTWARE.
 __author__ = "Mathtin"
 
 import asyncio
+import importlib.util
+import threading
+from concurrent.futures import Future
 from concurrent.futures.thread import ThreadPoolExecutor
 from logging import getLogger
-from typing import Type, Optional, Any, Dict, List
+from typing import Type, Optional, Any, Dict, List, Iterable, Tuple, Set
 
-from sqlalchemy import engine as SyncEngine, create_engine, select, update, delete
+from sqlalchemy import engine as SyncEngine, create_engine, event, select, update, delete, UniqueConstraint
 from sqlalchemy.engine import Result
 from sqlalchemy.exc import IntegrityError, DataError, InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, AsyncResult, AsyncSessionTransaction
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, SessionTransaction
 
+from . import queries as q
+from .config import DatabaseConfig
+from .migrations import migrate
+from .pool import TimedQueuePool, TimedAsyncQueuePool
 from .models.base import Base, BaseModel
 
 log = getLogger('db')
 
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': '-16000',
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, _) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+class SyncTablePlan(object):
+    """
+        Set-based table synchronization plan
+
+        Diffs table contents (fetched as plain tuples) against target values
+        and produces few bulk statements: one delete, batched updates of
+        changed rows and bulk upsert of new rows
+
+        Rows changing unique columns are updated in two stages (temporary
+        values first, final values then), so values moving between rows
+        (shifted or swapped) never collide
+    """
+
+    pk_col: str
+    cols: List[str]
+    unique_cols: List[str]
+    index: Dict[Any, Dict[str, Any]]
+    to_update: List[Dict[str, Any]]
+    to_stage: List[Dict[str, Any]]
+    to_insert: List[Dict[str, Any]]
+    # Existing and target values of unique columns
+    _taken: Dict[str, Set[Any]]
+
+    def __init__(self, values: List[Dict[str, Any]], pk_col: str, unique_cols: Iterable[str] = ()) -> None:
+        self.pk_col = pk_col
+        self.index = {v[pk_col]: v for v in values}
+        cols = list(values[0].keys()) if values else [pk_col]
+        self.cols = [pk_col] + [c for c in cols if c != pk_col]
+        self.unique_cols = [c for c in self.cols[1:] if c in set(unique_cols)]
+        self.to_update = []
+        self.to_stage = []
+        self.to_insert = []
+        self._taken = {c: {v[c] for v in values} for c in self.unique_cols}
+
+    @staticmethod
+    def unique_columns(model_type: Type[BaseModel]) -> Set[str]:
+        table = model_type.__table__
+        res = {col.name for col in table.columns if col.unique}
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                res.update(col.name for col in constraint.columns)
+        for index in table.indexes:
+            if index.unique:
+                res.update(col.name for col in index.columns)
+        return res
+
+    def diff(self, rows: Iterable[Tuple]) -> None:
+        present = set()
+        unique_idx = [(i, col) for i, col in enumerate(self.cols) if col in self.unique_cols]
+        for row in rows:
+            for i, col in unique_idx:
+                self._taken[col].add(row[i])
+            pk = row[0]
+            new_value = self.index.get(pk)
+            if new_value is None:
+                continue
+            present.add(pk)
+            if any(row[i] != new_value[col] for i, col in enumerate(self.cols) if i > 0):
+                self.to_update.append(new_value)
+                if any(row[i] != new_value[col] for i, col in unique_idx):
+                    self.to_stage.append(new_value)
+        self.to_insert = [v for pk, v in self.index.items() if pk not in present]
+
+    def _temp_values(self, col: str, count: int) -> List[Any]:
+        taken = self._taken[col]
+        if all(isinstance(v, int) for v in taken):
+            start = min(min(taken, default=0), 0) - 1
+            return [start - i for i in range(count)]
+        res = []
+        n = 0
+        while len(res) < count:
+            n += 1
+            value = f'~sync{n}'
+            if value not in taken:
+                res.append(value)
+        return res
+
+    def statements(self, model_type: Type[BaseModel], dialect: str) -> List[Tuple[Any, Any]]:
+        # Delete first to release unique values, then move changed unique values
+        # out of the way, then update and insert
+        res = [(q.delete_not_in(model_type, self.pk_col, list(self.index.keys())), None)]
+        b_pk = f'b_{self.pk_col}'
+        if self.to_stage:
+            temp = {col: self._temp_values(col, len(self.to_stage)) for col in self.unique_cols}
+            params = [{b_pk: v[self.pk_col], **{col: temp[col][i] for col in self.unique_cols}}
+                      for i, v in enumerate(self.to_stage)]
+            res.append((q.update_by_key(model_type, self.pk_col, self.unique_cols), params))
+        update_cols = self.cols[1:]
+        if self.to_update and update_cols:
+            params = [{b_pk: v[self.pk_col], **{c: v[c] for c in update_cols}} for v in self.to_update]
+            res.append((q.update_by_key(model_type, self.pk_col, update_cols), params))
+        if self.to_insert:
+            res.append((q.upsert(model_type, dialect, self.pk_col, self.cols), self.to_insert))
+        return res
+
+
+class DBExecutor(ThreadPoolExecutor):
+    """
+        Thread pool executor counting calls waiting for free worker
+    """
+
+    _queued: int
+    _queued_lock: threading.Lock
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = '') -> None:
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def _track(self, delta: int) -> None:
+        with self._queued_lock:
+            self._queued += delta
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        def started():
+            self._track(-1)
+            return fn(*args, **kwargs)
+
+        self._track(1)
+        try:
+            return super().submit(started)
+        except BaseException:
+            self._track(-1)
+            raise
+
 
 class DBSyncSession(object):
     _session: Session
@@ -61,8 +212,8 @@ class DBSyncSession(object):
     # Base session methods #
     ########################
 
-    def execute(self, statement: Any) -> Result:
-        return self._session.execute(statement)
+    def execute(self, statement: Any, params: Any = None) -> Result:
+        return self._session.execute(statement, params)
 
     def commit(self) -> None:
         try:
@@ -172,36 +323,23 @@ class DBSyncSession(object):
     def sync_table(self, model_type: Type[BaseModel],
                    values: List[Dict[str, Any]],
                    pk_col: str = 'id') -> None:
-        # In-memory table index
-        index = {}
-        for v in values:
-            index[v[pk_col]] = v
-        # Sync existing rows
-        for row in self.execute(select(model_type)).scalars().all():
-            # Remove not in values
-            if getattr(row, pk_col) not in index:
-                self.delete(model=row)
-                continue
-            # Update those are in values
-            new_values = index[getattr(row, pk_col)]
-            for col in new_values:
-                if getattr(row, col) != new_values[col]:
-                    setattr(row, col, new_values[col])
-            del index[getattr(row, pk_col)]
-        # Add absent
-        for pk in index:
-            new_value = index[pk]
-            self.add(model_type=model_type, value=new_value)
+        plan = SyncTablePlan(values, pk_col, SyncTablePlan.unique_columns(model_type))
+        plan.diff(self.execute(q.select_columns(model_type, plan.cols)))
+        for stmt, params in plan.statements(model_type, self._session.get_bind().dialect.name):
+            self.execute(stmt, params)
 
 
 class DBAsyncWrappedSession(object):
     _session: DBSyncSession
     _executor: ThreadPoolExecutor
+    _limiter: Optional[asyncio.Semaphore]
     sync_session: Session
 
-    def __init__(self, session: Session, executor: ThreadPoolExecutor) -> None:
+    def __init__(self, session: Session, executor: ThreadPoolExecutor,
+                 limiter: Optional[asyncio.Semaphore] = None) -> None:
         self._session = DBSyncSession(session)
         self._executor = executor
+        self._limiter = limiter
         self.sync_session = session
 
     async def _run_in_executor(self, func, *args, **kwargs) -> Any:
@@ -213,17 +351,24 @@ class DBAsyncWrappedSession(object):
         return await loop.run_in_executor(self._executor, wrapped)
 
     async def __aenter__(self):
+        # Session must not wait for pooled connection inside executor thread (would starve other sessions)
+        if self._limiter is not None:
+            await self._limiter.acquire()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        await self._run_in_executor(self._session.__exit__, exc_type, exc_val, exc_tb)
+        try:
+            await self._run_in_executor(self._session.__exit__, exc_type, exc_val, exc_tb)
+        finally:
+            if self._limiter is not None:
+                self._limiter.release()
 
     ########################
     # Base session methods #
     ########################
 
-    async def execute(self, statement: Any) -> Result:
-        return await self._run_in_executor(self._session.execute, statement)
+    async def execute(self, statement: Any, params: Any = None) -> Result:
+        return await self._run_in_executor(self._session.execute, statement, params)
 
     async def scalar(self, statement: Any) -> Result:
         result = await self.execute(statement)
@@ -336,8 +481,8 @@ class DBAsyncSession(object):
     # Base session methods #
     ########################
 
-    async def execute(self, statement: Any) -> Result:
-        return await self._session.execute(statement)
+    async def execute(self, statement: Any, params: Any = None) -> Result:
+        return await self._session.execute(statement, params)
 
     async def stream(self, statement: Any) -> AsyncResult:
         return await self._session.stream(statement)
@@ -450,27 +595,10 @@ class DBAsyncSession(object):
     async def sync_table(self, model_type: Type[BaseModel],
                          values: List[Dict[str, Any]],
                          pk_col: str = 'id') -> None:
-        # In-memory table index
-        index = {}
-        for v in values:
-            index[v[pk_col]] = v
-        # Sync existing rows
-        async for row in await self.stream(select(model_type)):
-            row = row[0]
-            # Remove not in values
-            if getattr(row, pk_col) not in index:
-                await self.delete(model=row)
-                continue
-            # Update those are in values
-            new_values = index[getattr(row, pk_col)]
-            for col in new_values:
-                if getattr(row, col) != new_values[col]:
-                    setattr(row, col, new_values[col])
-            del index[getattr(row, pk_col)]
-        # Add absent
-        for pk in index:
-            new_value = index[pk]
-            self.add(model_type=model_type, value=new_value)
+        plan = SyncTablePlan(values, pk_col, SyncTablePlan.unique_columns(model_type))
+        plan.diff(await self.execute(q.select_columns(model_type, plan.cols)))
+        for stmt, params in plan.statements(model_type, self._session.sync_session.get_bind().dialect.name):
+            await self.execute(stmt, params)
 
 
 class DBConnection(object):
@@ -483,38 +611,115 @@ class DBConnection(object):
     _async_session: Optional[DBAsyncSession]
 
     _wrap_sync: bool
-    _single_thread_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='DB_CONNECTION_THREAD_')
-
-    def __init__(self, engine_url: str) -> None:
-        if 'sqlite' in engine_url:
-            engine_url += '?check_same_thread=False'
-        sync_engine_url = engine_url.replace('+asyncpg', '')
+    _executor: DBExecutor
+    _executor_workers: int
+    _session_limiter: Optional[asyncio.Semaphore]
+    _config: DatabaseConfig
+
+    def __init__(self, engine_url: str, config: Optional[DatabaseConfig] = None) -> None:
+        self._config = config = config if config is not None else DatabaseConfig()
+        sqlite = engine_url.startswith('sqlite')
+        sqlite_file = sqlite and not self._is_sqlite_memory(engine_url)
+        sync_engine_url = engine_url.replace('+asyncpg', '').replace('+aiosqlite', '')
+        if sqlite:
+            sync_engine_url += '?check_same_thread=False'
+            # Native async driver (in-memory database can't be shared between engines)
+            if sqlite_file and importlib.util.find_spec('aiosqlite') is not None:
+                engine_url = sync_engine_url.replace('sqlite', 'sqlite+aiosqlite', 1)
+            else:
+                log.info('Native async sqlite is unavailable, sessions will be run in executor')
+                engine_url = None
         # Create sync backend
-        self._db_sync_engine = create_engine(sync_engine_url)
-        Base.metadata.create_all(self._db_sync_engine)
+        self._db_sync_engine = create_engine(sync_engine_url, **self._engine_options(sync_engine_url, TimedQueuePool))
+        if sqlite_file:
+            event.listen(self._db_sync_engine, 'connect', _set_sqlite_pragmas)
+        migrate(self._db_sync_engine, Base.metadata)
         self._session_sync_factory = sessionmaker(bind=self._db_sync_engine,
                                                   autocommit=False,
                                                   autoflush=True,
                                                   expire_on_commit=False)
         # Create async backend
-        if 'sqlite' in engine_url:
+        if engine_url is None:
             self._wrap_sync = True
         else:
-            self._db_async_engine = create_async_engine(engine_url)
+            self._db_async_engine = create_async_engine(engine_url,
+                                                        **self._engine_options(engine_url, TimedAsyncQueuePool))
+            if sqlite_file:
+                event.listen(self._db_async_engine.sync_engine, 'connect', _set_sqlite_pragmas)
             self._session_async_factory = sessionmaker(bind=self._db_async_engine,
                                                        autocommit=False,
                                                        autoflush=True,
                                                        class_=AsyncSession,
                                                        expire_on_commit=False)
             self._wrap_sync = False
+        self._executor_workers = config.executor_workers
+        self._executor = DBExecutor(max_workers=self._executor_workers, thread_name_prefix='DB_CONNECTION_THREAD_')
+        self._session_limiter = None
         self._sync_session = None
         self._async_session = None
 
+    @staticmethod
+    def _is_sqlite_memory(engine_url: str) -> bool:
+        return ':memory:' in engine_url or engine_url.split('?')[0].rstrip('/').endswith(':')
+
+    def _connect_args(self, engine_url: str) -> Dict[str, Any]:
+        timeout = self._config.statement_timeout
+        if timeout <= 0:
+            return {}
+        if engine_url.startswith('postgresql+asyncpg'):
+            return {'server_settings': {'statement_timeout': str(timeout)}}
+        if engine_url.startswith('postgresql'):
+            return {'options': f'-c statement_timeout={timeout}'}
+        if engine_url.startswith('sqlite'):
+            # Closest equivalent: how long to wait for locked database
+            return {'timeout': timeout / 1000}
+        return {}
+
+    def _engine_options(self, engine_url: str, poolclass: Type[Any]) -> Dict[str, Any]:
+        options = {'connect_args': self._connect_args(engine_url)}
+        # In-memory sqlite database lives within single connection
+        if engine_url.startswith('sqlite') and self._is_sqlite_memory(engine_url):
+            return options
+        options.update(poolclass=poolclass,
+                       pool_size=self._config.pool_size,
+                       max_overflow=self._config.max_overflow,
+                       pool_timeout=self._config.pool_timeout,
+                       pool_recycle=self._config.pool_recycle,
+                       pool_pre_ping=self._config.pool_pre_ping)
+        return options
+
+    @property
+    def config(self) -> DatabaseConfig:
+        return self._config
+
+    @property
+    def dialect(self) -> str:
+        return self._db_sync_engine.dialect.name
+
+    def status(self) -> Dict[str, Any]:
+        """
+            Returns connection pools and executor state
+        """
+        res = {}
+        if isinstance(self._db_sync_engine.pool, TimedQueuePool):
+            res['sync_pool'] = self._db_sync_engine.pool.status_dict()
+        if not self._wrap_sync and isinstance(self._db_async_engine.sync_engine.pool, TimedAsyncQueuePool):
+            res['async_pool'] = self._db_async_engine.sync_engine.pool.status_dict()
+        if self._wrap_sync:
+            res['executor'] = {
+                'workers': self._executor_workers,
+                'queued': self._executor.queued,
+            }
+        return res
+
     def sync_session(self):
         return DBSyncSession(self._session_sync_factory())
 
     def async_session(self):
         if self._wrap_sync:
-            return DBAsyncWrappedSession(self._session_sync_factory(), self._single_thread_pool)
+            if self._session_limiter is None and isinstance(self._db_sync_engine.pool, TimedQueuePool) \
+                    and self._config.max_overflow >= 0:
+                self._session_limiter = asyncio.Semaphore(self._config.pool_size + self._config.max_overflow)
+            return DBAsyncWrappedSession(self._session_sync_factory(), self._executor, self._session_limiter)
         else:
             return DBAsyncSession(self._session_async_factory())
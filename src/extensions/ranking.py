@@ -120,7 +120,9 @@ class RankingExtension(BotExtension):
         pass
 
     async def update_all_ranks(self) -> None:
-        pass
+        for member in self.bot.guild.members:
+            async with self.bot.locks.user(member.id):
+                await self.update_rank(member)
 
     #########
     # Hooks #
@@ -141,14 +143,13 @@ class RankingExtension(BotExtension):
 
     @BotExtension.command("update_all_ranks", description="Fetches all members of guild and updates each rank")
     async def cmd_update_all_ranks(self, msg: discord.Message):
-        async with self.sync():
-            await msg.channel.send(R.MESSAGE.STATUS.UPDATING_RANKS)
-            await self.update_all_ranks()
-            await msg.channel.send(R.MESSAGE.STATUS.SUCCESS)
+        await msg.channel.send(R.MESSAGE.STATUS.UPDATING_RANKS)
+        await self.update_all_ranks()
+        await msg.channel.send(R.MESSAGE.STATUS.SUCCESS)
 
     @BotExtension.command("update_rank", description="Update specified user rank")
     async def cmd_update_rank(self, msg: discord.Message, member: discord.Member):
-        async with self.sync():
+        async with self.bot.locks.user(member.id):
             await msg.channel.send(f'{R.MESSAGE.STATUS.UPDATING_RANK}: {member.mention}')
             await self.update_rank(member)
             await msg.channel.send(R.MESSAGE.STATUS.SUCCESS)
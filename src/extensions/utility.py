@@ -155,6 +155,51 @@ class UtilityExtension(BotExtension):
         R.switch_lang(lang)
         await msg.channel.send(R.MESSAGE.STATUS.SUCCESS)
 
+    @BotExtension.command("db_status", description="Prints database connection pool state")
+    async def cmd_db_status(self, msg: discord.Message):
+        status = self.bot.services.db.status()
+        embed = self.bot.new_info_report(R.EMBED.TITLE.DB_STATUS, self.bot.services.db.dialect)
+        pool_names = {'sync_pool': R.NAME.COMMON.SYNC_POOL, 'async_pool': R.NAME.COMMON.ASYNC_POOL}
+        for key, name in pool_names.items():
+            if key not in status:
+                continue
+            pool = status[key]
+            value = f'{R.NAME.STAT.CHECKED_OUT}: {pool["checked_out"]}/{pool["size"]} ' \
+                    f'({R.NAME.STAT.OVERFLOW} {pool["overflow"]}/{pool["max_overflow"]})\n' \
+                    f'{R.NAME.STAT.CHECKOUTS}: {pool["checkouts"]}, {R.NAME.STAT.TIMEOUTS}: {pool["timeouts"]}\n' \
+                    f'{R.NAME.STAT.WAIT}: {pool["avg_wait"] * 1000:.1f} {R.NAME.STAT.MS_AVG}, ' \
+                    f'{pool["max_wait"] * 1000:.1f} {R.NAME.STAT.MS_MAX}'
+            embed.add_field(name=name, value=value, inline=False)
+        if 'executor' in status:
+            executor = status['executor']
+            value = f'{R.NAME.STAT.WORKERS}: {executor["workers"]}, {R.NAME.STAT.QUEUED}: {executor["queued"]}'
+            embed.add_field(name=R.NAME.COMMON.DB_EXECUTOR, value=value, inline=False)
+        await msg.channel.send(embed=embed)
+
+    @BotExtension.command("dispatch_stats", description="Prints per-event handler counts, routing and latency")
+    async def cmd_dispatch_stats(self, msg: discord.Message):
+        stats = self.bot.dispatch_stats()
+        lines = []
+        for name, s in sorted(stats.items()):
+            line = f'`{name}`: {s["handlers"]} {R.NAME.STAT.HANDLERS}, {s["buckets"]} {R.NAME.STAT.BUCKETS}, ' \
+                   f'{s["calls"]} {R.NAME.STAT.CALLS}, {s["avg_time"] * 1000:.1f} {R.NAME.STAT.MS_AVG}'
+            if s['channels'] is not None:
+                line += f', {R.NAME.STAT.ROUTED_TO} {s["channels"]} {R.NAME.STAT.CHANNELS}, ' \
+                        f'{s["skipped"]} {R.NAME.STAT.SKIPPED}'
+            lines.append(line)
+        report = '\n'.join(lines) if lines else R.NAME.COMMON.NO_HANDLERS
+        embed = self.bot.new_info_report(R.EMBED.TITLE.DISPATCH_STATS, report)
+        for name, queue in self.bot.queue_stats().items():
+            value = f'{R.NAME.STAT.DEPTH}: {queue["depth"]}/{queue["size"]} ' \
+                    f'({R.NAME.STAT.MAX} {queue["max_depth"]}), {R.NAME.STAT.OVERFLOW}: {queue["overflow"]}\n' \
+                    f'{R.NAME.STAT.WORKERS}: {queue["active"]} {R.NAME.STAT.ACTIVE}, ' \
+                    f'{queue["workers"]}/{queue["max_workers"]} {R.NAME.STAT.RUNNING}\n' \
+                    f'{R.NAME.STAT.PROCESSED}: {queue["processed"]}/{queue["enqueued"]}, ' \
+                    f'{R.NAME.STAT.DROPPED}: {queue["dropped"]}, {R.NAME.STAT.COALESCED}: {queue["coalesced"]}\n' \
+                    f'{R.NAME.STAT.WAIT}: {queue["avg_wait"] * 1000:.1f} {R.NAME.STAT.MS_AVG}'
+            embed.add_field(name=name, value=value, inline=False)
+        await msg.channel.send(embed=embed)
+
     @BotExtension.command("status", description="Prints bot state summary")
     async def extension_status(self, msg: discord.Message):
         report = f'{R.NAME.COMMON.GUILD}: {self.bot.guild.name}\n'
@@ -28,25 +28,29 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+import asyncio
 import io
-import json
 import logging
 import re
-from typing import List, Dict
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional, Set
 
 import discord
 
 from db import PlayerProfile, User
-from overlord import OverlordMember
+from overlord import Overlord, OverlordMember
 from overlord.extension import BotExtension
-from services import UserService, RoleService, PlayerProfileService
+from services import UserService, RoleService, PlayerProfileService, MojangService
 from util import ConfigView
 from util.resources import STRINGS as R
 from util.exceptions import InvalidConfigException
-from util.extbot import is_text_channel, quote_msg, filter_roles, qualified_name
+from util.extbot import is_text_channel, quote_msg, filter_roles, qualified_name, ProgressEmbed
+from util.locks import LockManager
 from util.mcuuid import PlayerData
-from util.ftp import server_exists as ftp_server_exists, upload_file_content as ftp_upload_file_content
-from util.sftp import server_exists as sftp_server_exists, upload_file_content as sftp_upload_file_content
+from util.ftp import FTPConnection, server_exists as ftp_server_exists
+from util.sftp import SFTPConnection, server_exists as sftp_server_exists
+from util.uploader import ServerUploader, UploadPool
 
 log = logging.getLogger('whitelist-extension')
 
@@ -109,6 +113,19 @@ def _log_format_msg(msg: discord.Message) -> str:
     return msg.content[:30].replace('\n', ' ') + '...' if len(msg.content) > 10 else msg.content
 
 
+class ProfileCandidate(object):
+    """
+        Validated profile message waiting to be applied during whitelist reload
+    """
+    __slots__ = ('msg', 'member', 'user', 'player')
+
+    def __init__(self, msg: discord.Message, member: discord.Member, user: User, player: PlayerData) -> None:
+        self.msg = msg
+        self.member = member
+        self.user = user
+        self.player = player
+
+
 ####################
 # Whitelist Config #
 ####################
@@ -117,9 +134,13 @@ class WhitelistServerConfig(ConfigView):
     """
     server_... {
         access = "..."
+        timeout = ...
+        retries = ...
     }
     """
     access: str = "ftp"
+    timeout: int = 30
+    retries: int = 2
 
 
 class WhitelistConfig(ConfigView):
@@ -128,6 +149,9 @@ class WhitelistConfig(ConfigView):
         channel = ...
         remove_deprecated_profiles = ...
         required = ["────────[Minecraft]────────"]
+        ign_cache_ttl = ...
+        ign_negative_cache_ttl = ...
+        sync_delay = ...
         servers {
             WhitelistServerConfig...
         }
@@ -135,6 +159,9 @@ class WhitelistConfig(ConfigView):
     """
     channel: int = 0
     required: List[str] = []
+    ign_cache_ttl: int = 86400
+    ign_negative_cache_ttl: int = 3600
+    sync_delay: float = 2.0
     servers: Dict[str, WhitelistServerConfig] = {}
 
 
@@ -151,9 +178,20 @@ class WhitelistExtension(BotExtension):
     config: WhitelistConfig = WhitelistConfig()
     channel: discord.TextChannel
 
+    RELOAD_CHUNK_SIZE = 100
+    RELOAD_PROGRESS_INTERVAL = 3.0
+
     _dry_sync: bool
     _dry_run: bool
     _server_name_map: Dict[str, str]
+    _uploader: Optional[UploadPool] = None
+    _sync_lock: asyncio.Lock
+    _sync_task: Optional[asyncio.Task]
+
+    def __init__(self, bot: Overlord, priority=None) -> None:
+        super().__init__(bot, priority)
+        self._sync_lock = asyncio.Lock()
+        self._sync_task = None
 
     #########
     # Props #
@@ -171,6 +209,10 @@ class WhitelistExtension(BotExtension):
     def s_profiles(self) -> PlayerProfileService:
         return self.bot.services.player_profiles
 
+    @property
+    def s_mojang(self) -> MojangService:
+        return self.bot.services.mojang
+
     @property
     def required_roles(self) -> List[str]:
         return self.config.required
@@ -179,6 +221,11 @@ class WhitelistExtension(BotExtension):
     # Methods #
     ###########
 
+    def subscriptions(self, event: str) -> Optional[Set[int]]:
+        if event in ['on_message', 'on_message_edit', 'on_message_delete']:
+            return {self.config.channel} if self.config.channel != 0 else set()
+        return None
+
     def ignore_member(self, member: discord.Member) -> bool:
         return len(filter_roles(member, self.required_roles)) == 0
 
@@ -190,7 +237,7 @@ class WhitelistExtension(BotExtension):
         log.info(f'Adding {qualified_name(msg.author)}\'s profile')
         await self.s_profiles.add_profile(user, player, msg)
         if sync:
-            await self.sync_whitelist()
+            await self.request_sync()
 
     async def _update_profile(self,
                               profile: PlayerProfile,
@@ -204,7 +251,7 @@ class WhitelistExtension(BotExtension):
         profile.message_did = msg.id
         await self.s_profiles.save(profile)
         if sync:
-            await self.sync_whitelist()
+            await self.request_sync()
 
     async def _unlink_profile(self, profile: PlayerProfile, reason: str, sync: bool = True) -> None:
         log.info(f'Unlinking persistent profile ({reason})')
@@ -212,17 +259,35 @@ class WhitelistExtension(BotExtension):
         profile.message_did = None
         await self.s_profiles.save(profile)
         if sync:
-            await self.sync_whitelist()
+            await self.request_sync()
 
     async def _remove_profile(self, profile: PlayerProfile, reason: str, sync: bool = True) -> None:
         log.info(f'Removing profile ({reason})')
         await self.s_profiles.remove(profile)
         if sync:
-            await self.sync_whitelist()
+            await self.request_sync()
+
+    @asynccontextmanager
+    async def _locked_profile(self, ign: str) -> AsyncIterator[Optional[PlayerProfile]]:
+        """
+            Holds owner and profile keys of profile found by ign, yields profile re-read under them
+        """
+        while True:
+            profile = await self.s_profiles.get_by_ign(ign)
+            if profile is None:
+                yield None
+                return
+            async with self.bot.locks.shared((LockManager.USER, profile.user.did),
+                                             (LockManager.PROFILE, profile.uuid)):
+                locked = await self.s_profiles.get_by_ign(ign)
+                if locked is None or (locked.uuid, locked.user.did) == (profile.uuid, profile.user.did):
+                    yield locked
+                    return
+            # Ign moved to another profile or owner before keys were taken
 
     async def _send_profile(self, channel: discord.TextChannel, profile: PlayerProfile):
         user = profile.user
-        d_user = await self.bot.fetch_user(user.did)
+        d_user = await self.bot.resolve_d_user(user.did)
 
         desc = f'User: {d_user.mention}\n' \
                f'IGN: \'{profile.ign}\'\n' \
@@ -264,21 +329,168 @@ class WhitelistExtension(BotExtension):
         except discord.Forbidden:
             log.warning(f'{qualified_name(msg.author)} forbid dm messages')
 
+    async def _history_chunks(self, progress: ProgressEmbed) -> AsyncIterator[List[discord.Message]]:
+        """
+            Streams channel history in chunks, reporting throughput via progress embed
+        """
+        count = 0
+        started_at = updated_at = time.monotonic()
+        chunk = []
+        async for message in self.channel.history(limit=None, oldest_first=True):
+            chunk.append(message)
+            if len(chunk) < self.RELOAD_CHUNK_SIZE:
+                continue
+            yield chunk
+            count += len(chunk)
+            chunk = []
+            now = time.monotonic()
+            if now - updated_at >= self.RELOAD_PROGRESS_INTERVAL:
+                progress.set_info(self._throughput_info(count, now - started_at))
+                await progress.update()
+                updated_at = now
+        if chunk:
+            yield chunk
+            count += len(chunk)
+        progress.set_info(self._throughput_info(count, time.monotonic() - started_at))
+
+    @staticmethod
+    def _throughput_info(count: int, elapsed: float) -> str:
+        rate = count / elapsed if elapsed > 0 else float(count)
+        return f'{R.MESSAGE.STATUS.PROCESSED_MESSAGES}: {count} ({rate:.1f} msg/s)'
+
+    async def _validate_chunk(self, messages: List[discord.Message]) -> AsyncIterator[ProfileCandidate]:
+        """
+            Parses and validates chunk of profile messages, removing invalid ones
+
+            Messages are removed as 'user left' only if member lookup fails with NotFound
+        """
+        parsed = [parse_colon_separated(msg.content) for msg in messages]
+        players = await self.s_mojang.resolve_many({p['ign'] for p in parsed if 'ign' in p})
+        users = {u.did: u for u in await self.s_users.get_all_by_did({msg.author.id for msg in messages})}
+        for msg, profile in zip(messages, parsed):
+            # Member cache first, REST fallback (cache miss does not mean user left)
+            try:
+                member = await self.bot.resolve_member(msg.author.id)
+            except discord.NotFound:
+                await self._remove_message(msg, 'user left')
+                continue
+            if self.ignore_member(member):
+                await self._remove_message(msg, 'requirements not met')
+                continue
+            # Handle invalid profile
+            if 'ign' not in profile:
+                if self.bot.is_admin(member):
+                    log.info(f'Ignoring \'{_log_format_msg(msg)}\' from {qualified_name(member)} '
+                             f'(invalid profile from admin)')
+                    continue
+                await self._report_and_remove(msg, INVALID_PROFILE_DM_MSG, 'invalid profile')
+                continue
+            # Handle invalid ign
+            player = players.get(profile['ign'].lower())
+            if player is None or not player.valid:
+                if self.bot.is_admin(member):
+                    log.info(f'Ignoring \'{_log_format_msg(msg)}\' from {qualified_name(member)} '
+                             f'(invalid ign from admin)')
+                    continue
+                await self._report_and_remove(msg, INVALID_PROFILE_IGN_DM_MSG, 'invalid ign')
+                continue
+            user = users.get(member.id)
+            if user is None:
+                log.warning(f'{qualified_name(member)} does not exist in db! Skipping profile!')
+                continue
+            yield ProfileCandidate(msg, member, user, player)
+
+    async def _dedupe_profiles(self, progress: ProgressEmbed) -> Dict[str, ProfileCandidate]:
+        """
+            Streams validated profiles keeping the latest message per uuid
+        """
+        owners = {p.uuid: p.user.did for p in await self.s_profiles.get_persistent()}
+        latest: Dict[str, ProfileCandidate] = {}
+        async for messages in self._history_chunks(progress):
+            async for candidate in self._validate_chunk(messages):
+                uuid = str(candidate.player.uuid)
+                owner: Optional[int] = latest[uuid].member.id if uuid in latest else owners.get(uuid)
+                if owner is not None and owner != candidate.member.id:
+                    await self._report_and_remove(candidate.msg, FOREIGN_PROFILE_DM_MSG, 'duplicate ign')
+                    continue
+                if uuid in latest:
+                    await self._remove_message(latest[uuid].msg, 'old profile')
+                latest[uuid] = candidate
+        return latest
+
     async def get_whitelist_json(self) -> str:
-        profiles = await self.s_profiles.get_whitelisted()
-        return json.dumps([{"uuid": p.uuid, "name": p.ign} for p in profiles], indent=4)
+        return (await self.s_profiles.get_whitelist_content()).decode()
 
-    async def sync_whitelist(self) -> None:
+    async def sync_whitelist(self, force: bool = False) -> None:
         if self._dry_sync or self._dry_run:
             return
-        log.info("Synchronizing whitelist")
-        wl = (await self.get_whitelist_json()).encode()
+        async with self._sync_lock:
+            if self._uploader is None:
+                return
+            log.info("Synchronizing whitelist")
+            wl = await self.s_profiles.get_whitelist_content()
+            results = await self._uploader.upload(wl, 'whitelist.json', force)
+        uploaded = [name for name, r in results.items() if r is True]
+        failed = {name: r for name, r in results.items() if isinstance(r, BaseException)}
+        log.info(f'Whitelist uploaded to {len(uploaded)} server(s), '
+                 f'{len(results) - len(uploaded) - len(failed)} unchanged, {len(failed)} failed')
+        if failed:
+            report = '\n'.join(f'{name}: {e!r}' for name, e in failed.items())
+            await self.bot.send_warning(self.__extname__, f'Failed to upload whitelist:\n{report}')
+
+    async def request_sync(self) -> None:
+        """
+            Schedules whitelist synchronization coalescing all changes made within sync delay
+        """
+        if self.config.sync_delay <= 0:
+            await self.sync_whitelist()
+            return
+        if self._sync_task is not None and not self._sync_task.done():
+            return
+        self._sync_task = self.bot.loop.create_task(self.run_handler(self._delayed_sync))
+
+    async def _delayed_sync(self) -> None:
+        await asyncio.sleep(self.config.sync_delay)
+        # Changes from now on require another sync
+        self._sync_task = None
+        await self.sync_whitelist()
+
+    def _build_uploader(self) -> UploadPool:
+        uploaders = []
         for server_entry, server_config in self.config.servers.items():
             server_name = self._server_name_map[server_entry]
             if server_config.access == 'ftp':
-                ftp_upload_file_content(wl, 'whitelist.json', server_name)
-            elif server_config.access == 'sftp':
-                sftp_upload_file_content(wl, 'whitelist.json', server_name)
+                connection = FTPConnection.from_env(server_name, timeout=server_config.timeout)
+            else:
+                connection = SFTPConnection.from_env(server_name, timeout=server_config.timeout)
+            uploaders.append(ServerUploader(server_name, connection,
+                                            timeout=server_config.timeout,
+                                            retries=server_config.retries))
+        return UploadPool(uploaders)
+
+    async def _flush_sync(self) -> None:
+        try:
+            await self.sync_whitelist()
+        finally:
+            self._sync_task = None
+            if self._uploader is not None:
+                self._uploader.close()
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        super().stop()
+        if self._sync_task is not None:
+            # Changes made within sync delay are uploaded right away, uploader is closed afterwards
+            self._sync_task.cancel()
+            self._sync_task = self.bot.loop.create_task(self.run_handler(self._flush_sync))
+        elif self._uploader is not None:
+            self._uploader.close()
+
+    async def shutdown(self) -> None:
+        await super().shutdown()
+        if self._sync_task is not None:
+            await self._sync_task
 
     #########
     # Hooks #
@@ -287,6 +499,7 @@ class WhitelistExtension(BotExtension):
     async def on_ready(self) -> None:
         self._dry_sync = False
         self._dry_run = False
+        await self.s_mojang.clear_expired()
 
     async def on_config_update(self) -> None:
         self.config = self.bot.get_config_section(WhitelistConfig)
@@ -310,6 +523,10 @@ class WhitelistExtension(BotExtension):
         for i, role_name in enumerate(self.required_roles):
             if self.s_roles.get_d_role(role_name) is None:
                 raise InvalidConfigException(f"No such role: '{role_name}'", self.config.path(f"required[{i}]"))
+        # Apply ign cache settings
+        self.s_mojang.set_ttl(self.config.ign_cache_ttl, self.config.ign_negative_cache_ttl)
+        if self.config.sync_delay < 0:
+            raise InvalidConfigException('Sync delay should be non-negative', self.config.path('sync_delay'))
         # Check servers
         self._server_name_map = {}
         for server_entry, server_config in self.config.servers.items():
@@ -328,7 +545,17 @@ class WhitelistExtension(BotExtension):
                 if not sftp_server_exists(server_name):
                     raise InvalidConfigException(f'Server {server_name} not found',
                                                  self.config.path(f'servers.{server_name}'))
+            if server_config.timeout <= 0:
+                raise InvalidConfigException('Timeout should be positive',
+                                             self.config.path(f'servers.{server_entry}.timeout'))
+            if server_config.retries < 0:
+                raise InvalidConfigException('Retries should be non-negative',
+                                             self.config.path(f'servers.{server_entry}.retries'))
             self._server_name_map[server_entry] = server_name
+        # Reconnect with new settings
+        if self._uploader is not None:
+            self._uploader.close()
+        self._uploader = self._build_uploader()
 
     async def on_message(self, msg: discord.Message) -> None:
         if msg.channel != self.channel:
@@ -356,7 +583,7 @@ class WhitelistExtension(BotExtension):
             await self._report_and_remove(msg, INVALID_PROFILE_DM_MSG, 'invalid profile')
             return
 
-        player_data = PlayerData(parsed['ign'])
+        player_data = await self.s_mojang.resolve(parsed['ign'])
 
         # Handle invalid ign
         if not player_data.valid:
@@ -366,7 +593,8 @@ class WhitelistExtension(BotExtension):
             await self._report_and_remove(msg, INVALID_PROFILE_IGN_DM_MSG, 'invalid ign')
             return
 
-        async with self.sync():
+        async with self.bot.locks.shared((LockManager.USER, member.id),
+                                         (LockManager.PROFILE, str(player_data.uuid))):
             # Handle existing
             existing = await self.s_profiles.get_by_uuid(player_data.uuid)
             if existing is not None:
@@ -401,7 +629,7 @@ class WhitelistExtension(BotExtension):
             await self._remove_profile(profile, 'invalid profile')
             return
 
-        player_data = PlayerData(parsed['ign'])
+        player_data = await self.s_mojang.resolve(parsed['ign'])
 
         # Handle invalid ign
         if not player_data.valid:
@@ -409,7 +637,10 @@ class WhitelistExtension(BotExtension):
             await self._remove_profile(profile, 'invalid ign')
             return
 
-        async with self.sync():
+        async with self.bot.locks.shared((LockManager.MESSAGE, raw.message_id),
+                                         (LockManager.USER, member.id),
+                                         (LockManager.PROFILE, profile.uuid),
+                                         (LockManager.PROFILE, str(player_data.uuid))):
             # Handle existing
             existing = await self.s_profiles.get_by_uuid(player_data.uuid)
             if existing is not None:
@@ -427,7 +658,14 @@ class WhitelistExtension(BotExtension):
     async def on_message_delete(self, raw: discord.RawMessageUpdateEvent) -> None:
         if raw.channel_id != self.channel.id:
             return
-        async with self.sync():
+        profile = await self.s_profiles.get_by_message_did(raw.message_id)
+        if profile is None:
+            return
+        # Owner and profile keys exclude profile update moving message_did (old message is deleted
+        # by on_message/on_message_edit while holding them), so profile is re-read inside the lock
+        async with self.bot.locks.shared((LockManager.MESSAGE, raw.message_id),
+                                         (LockManager.USER, profile.user.did),
+                                         (LockManager.PROFILE, profile.uuid)):
             profile = await self.s_profiles.get_by_message_did(raw.message_id)
             if profile is None:
                 return
@@ -440,7 +678,7 @@ class WhitelistExtension(BotExtension):
         if self.ignore_member(before.discord) or not self.ignore_member(after.discord):
             return
         # Handle situation when member lost required role
-        async with self.sync():
+        async with self.bot.locks.user(after.discord.id):
             profiles = await self.s_profiles.get_all(after.db)
             for profile in profiles:
                 if profile.message_did is None:
@@ -452,7 +690,7 @@ class WhitelistExtension(BotExtension):
     async def on_member_remove(self, member: OverlordMember) -> None:
         if self.ignore_member(member.discord):
             return
-        async with self.sync():
+        async with self.bot.locks.user(member.discord.id):
             profiles = await self.s_profiles.get_all(member.db)
             for profile in profiles:
                 if profile.message_did is None:
@@ -477,23 +715,28 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_status", description="Check if whitelist synchronization is enabled")
     async def cmd_wl_status(self, msg: discord.Message):
-        await msg.channel.send(R.MESSAGE.STATE.DISABLED if self._dry_run else R.MESSAGE.STATE.ENABLED)
+        state = R.MESSAGE.STATE.DISABLED if self._dry_run else R.MESSAGE.STATE.ENABLED
+        stats = self.s_mojang.stats()
+        cache_report = f'{R.NAME.COMMON.IGN_CACHE}: {stats["size"]} {R.NAME.STAT.ENTRIES}, ' \
+                       f'{stats["memory_hits"]} {R.NAME.STAT.MEMORY_HITS}, ' \
+                       f'{stats["db_hits"]} {R.NAME.STAT.DB_HITS}, {stats["misses"]} {R.NAME.STAT.MISSES}'
+        await msg.channel.send(f'{state}\n{cache_report}')
 
     @BotExtension.command("reload_wl", description="Reloads profiles from channel")
     async def cmd_reload_wl(self, msg: discord.Message):
         progress = self.new_progress(f'{R.MESSAGE.STATUS.SYNC_WHITELIST}')
-        progress.add_step(R.MESSAGE.STATUS.REMOVING_DYNAMIC_PROFILES)
         progress.add_step(R.MESSAGE.STATUS.LOADING_DYNAMIC_PROFILES)
+        progress.add_step(R.MESSAGE.STATUS.COMMITTING)
         progress.add_step(R.MESSAGE.STATUS.SYNC_WHITELIST)
         await progress.start(msg.channel)
         try:
             self._dry_sync = True
-            # Transaction begins
             async with self.bot.sync():
-                await self.s_profiles.clear_dynamic()
+                # Parse, validate and dedupe channel history
+                profiles = await self._dedupe_profiles(progress)
                 await progress.next_step()
-                async for message in self.channel.history(limit=None, oldest_first=True):
-                    await self.on_message(message)
+                # Transaction begins
+                await self.s_profiles.replace_dynamic([(p.user, p.player, p.msg) for p in profiles.values()])
             await progress.next_step()
         except Exception:
             await progress.finish(failed=True)
@@ -505,19 +748,20 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("sync_wl", description="Synchronize whitelist between servers")
     async def cmd_sync_wl(self, msg: discord.Message):
-        await self.sync_whitelist()
+        await self.sync_whitelist(force=True)
         await msg.channel.send(R.MESSAGE.STATUS.SUCCESS)
 
     @BotExtension.command("wl_add", description="Add persistent whitelist entry")
     async def cmd_wl_add(self, msg: discord.Message, user: OverlordMember, ign: str):
-        player_data = PlayerData(ign)
+        player_data = await self.s_mojang.resolve(ign)
 
         # Handle invalid ign
         if not player_data.valid:
             await msg.channel.send(R.MESSAGE.ERROR_OTHER.INVALID_IGN)
             return
 
-        async with self.sync():
+        async with self.bot.locks.shared((LockManager.USER, user.discord.id),
+                                         (LockManager.PROFILE, str(player_data.uuid))):
             # Handle existing
             existing = await self.s_profiles.get_by_ign(ign)
             if existing is not None:
@@ -538,8 +782,7 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_remove", description="Remove persistent whitelist entry")
     async def cmd_wl_remove(self, msg: discord.Message, ign):
-        async with self.sync():
-            profile = await self.s_profiles.get_by_ign(ign)
+        async with self._locked_profile(ign) as profile:
             if profile is None:
                 await msg.channel.send(R.MESSAGE.ERROR_OTHER.UNKNOWN_PLAYER)
                 return
@@ -558,8 +801,7 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_force_remove", description="Remove persistent whitelist entry including profile")
     async def cmd_wl_force_remove(self, msg: discord.Message, ign):
-        async with self.sync():
-            profile = await self.s_profiles.get_by_ign(ign)
+        async with self._locked_profile(ign) as profile:
             if profile is None:
                 await msg.channel.send(R.MESSAGE.ERROR_OTHER.UNKNOWN_PLAYER)
                 return
@@ -592,8 +834,7 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_ban", description="Ban player (preserving profile)")
     async def cmd_wl_ban(self, msg: discord.Message, ign: str):
-        async with self.sync():
-            profile = await self.s_profiles.get_by_ign(ign)
+        async with self._locked_profile(ign) as profile:
             if profile is None:
                 await msg.channel.send(R.MESSAGE.ERROR_OTHER.UNKNOWN_PLAYER)
                 return
@@ -606,8 +847,7 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_unban", description="Unban player")
     async def cmd_wl_unban(self, msg: discord.Message, ign: str):
-        async with self.sync():
-            profile = await self.s_profiles.get_by_ign(ign)
+        async with self._locked_profile(ign) as profile:
             if profile is None:
                 await msg.channel.send(R.MESSAGE.ERROR_OTHER.UNKNOWN_PLAYER)
                 return
@@ -620,6 +860,6 @@ class WhitelistExtension(BotExtension):
 
     @BotExtension.command("wl_get", description="Sends whitelist json")
     async def cmd_wl_get(self, msg: discord.Message):
-        async with self.sync():
+        async with self.bot.locks.shared():
             f = io.StringIO(await self.get_whitelist_json())
             await msg.channel.send(content="Whitelist", file=discord.File(fp=f, filename="whitelist.json"))
@@ -38,7 +38,7 @@ load_dotenv()
 
 from util import ConfigView, ConfigManager
 from util.logger import LoggerRootConfig, update_config as update_logger
-from db import DBConnection
+from db import DBConnection, DatabaseConfig
 from services.provider import ServiceProvider
 from overlord import OverlordRootConfig
 from overlord.bot import Overlord
@@ -60,10 +60,12 @@ class ExtensionsConfig(ConfigView):
 class RootConfig(ConfigView):
     """
     logger      : LoggerRootConfig
+    database    : DatabaseConfig
     bot         : OverlordRootConfig
     extension   : ExtensionsConfig
     """
     logger: LoggerRootConfig = LoggerRootConfig()
+    database: DatabaseConfig = DatabaseConfig()
     bot: OverlordRootConfig = OverlordRootConfig()
     extension: ExtensionsConfig = ExtensionsConfig()
 
@@ -88,7 +90,7 @@ def main(argv):
 
     # Init database
     url = os.getenv('DATABASE_ACCESS_URL')
-    connection = DBConnection(url)
+    connection = DBConnection(url, cnf_manager.config.database)
     services = ServiceProvider(connection)
 
     # Init bot
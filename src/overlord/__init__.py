@@ -29,8 +29,9 @@ SOFTWARE.
 __author__ = "Mathtin"
 
 from .types import OverlordGenericObject, OverlordMember, OverlordRole, OverlordUser
-from .types import OverlordControlConfig, OverlordRootConfig
+from .types import OverlordControlConfig, OverlordRootConfig, OverlordDispatchConfig, OverlordQueueConfig
 from .task import OverlordTask
 from .command import OverlordCommand
+from .queue import ExtensionQueue
 from .bot import Overlord
 
@@ -33,20 +33,26 @@ import logging
 import os
 import re
 import sys
+import time
 import traceback
-from typing import Dict, List, Callable, Awaitable, Optional, Union, Any, Tuple
+from collections import deque
+from functools import partial
+from typing import Dict, List, Callable, Awaitable, Optional, Union, Any, Tuple, Set
 
 import discord
 
 import db as DB
 from services.provider import ServiceProvider
 from util import parse_control_message, limit_traceback
+from util.cache import TTLCache
 from util.config import ConfigManager
+from util.locks import LockManager
 from util.exceptions import InvalidConfigException, NotCoroutineException
 from util.extbot import qualified_name, is_dm_message, filter_roles, is_text_channel
 from util.extbot import skip_bots, after_initialized, guild_member_event, get_coroutine_attrs
 from util.logger import DiscordLogConfig
 from util.resources import STRINGS as R
+from .queue import ExtensionQueue
 from .types import OverlordMember, OverlordRole, IBotExtension, OverlordRootConfig
 
 log = logging.getLogger('mc-bot')
@@ -58,12 +64,27 @@ log = logging.getLogger('mc-bot')
 
 class Overlord(discord.Client):
     # Internal stuff
-    _async_lock: asyncio.locks
+    _locks: LockManager
     _initialized: bool
+    _init_event: asyncio.Event
+    # Events arrived before initialization: (handler, args, kwargs)
+    _startup_events: deque
     _extensions: List[IBotExtension]
     _handlers: Dict[str, Callable[..., Awaitable[None]]]
+    # Compiled dispatch table: event -> non-empty priority buckets (events without handlers omitted)
     _call_plan_map: Dict[str, List[List[Callable[..., Awaitable[None]]]]]
+    # Dispatch statistics: event -> [calls, total time, skipped by routing]
+    _dispatch_stats: Dict[str, List[float]]
+    # Routing index: channel scoped event -> subscribed channel ids (None means any channel)
+    _routing_index: Dict[str, Optional[Set[int]]]
     _cmd_cache: Dict[str, Callable[..., Awaitable[None]]]
+    # Control channel (and maintainer DM) messages referenced by reactions
+    _message_cache: TTLCache
+
+    STARTUP_BUFFER_SIZE = 1024
+    ROUTED_EVENTS = ['on_message', 'on_message_edit', 'on_message_delete']
+    MESSAGE_CACHE_SIZE = 256
+    MESSAGE_CACHE_TTL = 3600.0
 
     # Members loaded from ENV
     _token: str
@@ -93,14 +114,19 @@ class Overlord(discord.Client):
         super().__init__(intents=intents)
 
         # Init internal fields
-        self._async_lock = asyncio.Lock()
+        self._locks = LockManager()
         self._initialized = False
+        self._init_event = asyncio.Event()
+        self._startup_events = deque()
         self.log_channel = None
         self._extensions = []
         handlers = get_coroutine_attrs(self, name_filter=lambda x: x.startswith('on_'))
         self._handlers = {n.replace('_raw', ''): h for n, h in handlers.items()}
         self._call_plan_map = {}
+        self._dispatch_stats = {}
+        self._routing_index = {}
         self._cmd_cache = {}
+        self._message_cache = TTLCache(maxsize=self.MESSAGE_CACHE_SIZE, ttl=self.MESSAGE_CACHE_TTL)
 
         # Set user supplied fields
         self.cnf_manager = cnf_manager
@@ -116,16 +142,63 @@ class Overlord(discord.Client):
     # Private sync methods #
     ########################
 
+    @staticmethod
+    def _handles(extension: IBotExtension, handler_name: str) -> bool:
+        try:
+            return extension.handles(handler_name)
+        except NotImplementedError:
+            return hasattr(extension, handler_name)
+
     def _build_call_plan(self, handler_name) -> None:
         if handler_name == 'on_error':
             return
         # Build call plan
         call_plan = [[] for _ in range(64)]
         for extension in self._extensions:
-            if not hasattr(extension, handler_name):
+            if not self._handles(extension, handler_name):
                 continue
             call_plan[extension.priority].append(getattr(extension, handler_name))
-        self._call_plan_map[handler_name] = [call for call in call_plan if call]
+        call_plan = [call for call in call_plan if call]
+        # Events nobody handles are not dispatched at all
+        if call_plan:
+            self._call_plan_map[handler_name] = call_plan
+
+    @staticmethod
+    def _subscriptions(extension: IBotExtension, event: str) -> Optional[Set[int]]:
+        try:
+            return extension.subscriptions(event)
+        except NotImplementedError:
+            return None
+
+    def _build_routing_index(self) -> None:
+        self._routing_index = {}
+        for event in self.ROUTED_EVENTS:
+            channels = set()
+            for extension in self._extensions:
+                if not self._handles(extension, event):
+                    continue
+                subscribed = self._subscriptions(extension, event)
+                if subscribed is None:
+                    channels = None
+                    break
+                channels |= subscribed
+            self._routing_index[event] = channels
+
+    def _configure_queues(self) -> None:
+        dispatch = self.config.dispatch
+        ext_names = [type(ext).__name__ for ext in self._extensions]
+        for name in dispatch.extensions:
+            if name not in ext_names:
+                raise InvalidConfigException(f"No such extension: {name}", dispatch.path(f'extensions.{name}'))
+        for ext, name in zip(self._extensions, ext_names):
+            config = dispatch.extensions.get(name, dispatch.queue)
+            if config.size < 1:
+                raise InvalidConfigException(f"Queue size should be positive", config.path('size'))
+            if config.workers < 1:
+                raise InvalidConfigException(f"Queue worker count should be positive", config.path('workers'))
+            if config.overflow not in ExtensionQueue.OVERFLOW_POLICIES:
+                raise InvalidConfigException(f"Unknown overflow policy: {config.overflow}", config.path('overflow'))
+            ext.configure_queue(config)
 
     def _find_cmd_handler(self, name: str) -> Callable[..., Awaitable[None]]:
         for ext in self._extensions:
@@ -138,11 +211,55 @@ class Overlord(discord.Client):
     # Private async methods #
     #########################
 
+    async def _resolve_reaction(self, payload: discord.RawReactionActionEvent, event: str) \
+            -> Optional[Tuple[discord.Member, discord.Message, bool]]:
+        """
+            Resolves reaction member and message (and whether it is control reaction)
+
+            Irrelevant reactions are filtered by payload before any resolution,
+            gateway caches are used first, REST is a fallback only
+        """
+        if payload.guild_id is None:
+            # Only maintainer DM reactions are handled (as control ones)
+            if payload.user_id != self.maintainer.id:
+                return None
+            control = True
+        elif payload.guild_id != self.guild.id:
+            return None
+        else:
+            control = payload.channel_id == self.control_channel.id
+        if not self.has_handlers(f'on_control_{event}' if control else f'on_{event}'):
+            return None
+        try:
+            member = payload.member
+            if member is None:
+                member = await self.resolve_member(payload.user_id)
+            if member.bot:
+                return None
+            channel = self.get_channel(payload.channel_id)
+            if channel is None:
+                channel = await self.fetch_channel(payload.channel_id)
+            message = await self.resolve_message(channel, payload.message_id, cache=control)
+        except discord.NotFound:
+            return None
+        return member, message, control
+
     async def _run_call_plan(self, name: str, *args, **kwargs) -> None:
-        call_plan = self._call_plan_map[name]
-        for handlers in call_plan:
-            calls = [h(*args, **kwargs) for h in handlers]
-            await asyncio.gather(*calls)
+        call_plan = self._call_plan_map.get(name)
+        if call_plan is None:
+            return
+        start = time.perf_counter()
+        try:
+            for handlers in call_plan:
+                # Single handler buckets are awaited directly
+                if len(handlers) == 1:
+                    await handlers[0](*args, **kwargs)
+                else:
+                    await asyncio.gather(*[h(*args, **kwargs) for h in handlers])
+        finally:
+            stats = self._dispatch_stats.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
 
     ###########
     # Getters #
@@ -156,8 +273,15 @@ class Overlord(discord.Client):
     def prefix(self) -> str:
         return self.config.control.prefix
 
-    def sync(self) -> asyncio.Lock:
-        return self._async_lock
+    @property
+    def locks(self) -> LockManager:
+        return self._locks
+
+    def sync(self):
+        """
+            Exclusive bot-wide lock (waits for all keyed locks to be released)
+        """
+        return self._locks.exclusive()
 
     def is_guild_member(self, member: discord.Member) -> bool:
         return member.guild.id == self.guild.id
@@ -232,17 +356,50 @@ class Overlord(discord.Client):
     # Resolvers #
     #############
 
+    async def resolve_d_user(self, did: int) -> discord.User:
+        """
+            Returns user from client cache, fetches it otherwise (raises discord.NotFound)
+        """
+        user = self.get_user(did)
+        if user is None:
+            user = await self.fetch_user(did)
+        return user
+
+    async def resolve_message(self, channel: discord.abc.Messageable, message_id: int,
+                              cache: bool = False) -> discord.Message:
+        """
+            Returns message from bot or client message cache, fetches it otherwise (raises discord.NotFound)
+
+            Fetched message is kept in bounded bot message cache if cache flag is set
+        """
+        message = self._message_cache.get(message_id)
+        if message is not None:
+            return message
+        message = self._connection._get_message(message_id)
+        if message is None:
+            message = await channel.fetch_message(message_id)
+        if cache:
+            self._message_cache.set(message_id, message)
+        return message
+
+    async def resolve_member(self, did: int) -> discord.Member:
+        """
+            Returns guild member from member cache, fetches it otherwise (raises discord.NotFound)
+        """
+        member = self.guild.get_member(did)
+        if member is None:
+            member = await self.guild.fetch_member(did)
+        return member
+
     async def resolve_user(self, user_mention: str) -> Optional[DB.User]:
+        # Resolved by in-memory user indexes (no REST round trip for mentions)
         try:
             if '#' in user_mention:
                 return await self.services.user.get_by_qualified_name(user_mention)
             elif user_mention.startswith('<@'):
-                d_user = await self.fetch_user(int(re.findall(r'\d+', user_mention)[0]))
-                return await self.services.user.get(d_user)
+                return await self.services.user.get_by_did(int(re.findall(r'\d+', user_mention)[0]))
             else:
                 return await self.services.user.get_by_display_name(user_mention)
-        except discord.NotFound:
-            return None
         except ValueError:
             return None
         except IndexError:
@@ -300,12 +457,56 @@ class Overlord(discord.Client):
         if self.log_config is None:
             raise InvalidConfigException("DiscordLogConfig section not found", "root")
 
+    def has_handlers(self, event: str) -> bool:
+        return event in self._call_plan_map
+
+    def routes(self, event: str, channel_id: int) -> bool:
+        """
+            Checks whether any extension is subscribed to event in channel
+
+            Events rejected here are counted as skipped in dispatch stats
+        """
+        if event not in self._call_plan_map:
+            return False
+        channels = self._routing_index.get(event)
+        if channels is None or channel_id in channels:
+            return True
+        self._dispatch_stats.setdefault(event, [0, 0.0, 0])[2] += 1
+        return False
+
+    def dispatch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+            Returns per-event dispatch summary
+
+            Handler count, priority buckets, calls and average latency (seconds)
+        """
+        result = {}
+        for name, call_plan in self._call_plan_map.items():
+            calls, total, skipped = self._dispatch_stats.get(name, (0, 0.0, 0))
+            channels = self._routing_index.get(name)
+            result[name] = {
+                'handlers': sum(len(handlers) for handlers in call_plan),
+                'buckets': len(call_plan),
+                'channels': len(channels) if channels is not None else None,
+                'skipped': skipped,
+                'calls': calls,
+                'avg_time': total / calls if calls else 0.0
+            }
+        return result
+
+    def queue_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+            Returns event queue metrics of extensions running in queued mode
+        """
+        return {ext.name: ext.queue.stats() for ext in self._extensions if ext.queue is not None}
+
     def extend(self, extension: IBotExtension) -> None:
         self._extensions.append(extension)
         self._extensions.sort(key=lambda e: e.priority)
         self._call_plan_map = {}
         for h in self._handlers:
             self._build_call_plan(h)
+        self._build_routing_index()
 
     def update_command_cache(self) -> None:
         self._cmd_cache = {}
@@ -322,13 +523,36 @@ class Overlord(discord.Client):
 
     async def logout(self) -> None:
         for ext in self._extensions:
-            ext.stop()
+            await ext.shutdown()
+        await self.services.close()
         return await super().logout()
 
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
     async def init_lock(self) -> None:
-        while not self._initialized:
-            await asyncio.sleep(0.1)
-        return
+        if not self._initialized:
+            await self._init_event.wait()
+
+    def defer_event(self, handler: Callable[..., Awaitable[None]], *args, **kwargs) -> None:
+        """
+            Buffers event handler call until bot is initialized (bounded, excess events are dropped)
+        """
+        if len(self._startup_events) >= self.STARTUP_BUFFER_SIZE:
+            log.warning(f'Startup event buffer is full, dropping {handler.__name__} event')
+            return
+        self._startup_events.append((handler, args, kwargs))
+
+    def _mark_initialized(self) -> None:
+        self._initialized = True
+        self._init_event.set()
+        if self._startup_events:
+            log.info(f'Replaying {len(self._startup_events)} events received during startup')
+        # Scheduled in arrival order, errors are reported via on_error
+        while self._startup_events:
+            handler, args, kwargs = self._startup_events.popleft()
+            self._schedule_event(partial(handler, self), handler.__name__, *args, **kwargs)
 
     async def send_error(self, from_: str, msg: str) -> None:
         error_report = self.new_error_report(from_, msg)
@@ -355,12 +579,22 @@ class Overlord(discord.Client):
         log.info('Syncing roles')
         await self.services.role.load(self.guild.roles)
         log.info(f'Syncing users')
-        await self.services.user.mark_everyone_absent()
+        seen = set()
+        chunk = []
         async for member in self.guild.fetch_members(limit=None):
             if member.bot:
                 continue
+            chunk.append(member)
             # Update and repair
-            await self.services.user.merge_member(member)
+            if len(chunk) >= self.services.user.SYNC_CHUNK_SIZE:
+                await self.services.user.merge_members(chunk)
+                seen.update(m.id for m in chunk)
+                chunk = []
+        if chunk:
+            await self.services.user.merge_members(chunk)
+            seen.update(m.id for m in chunk)
+        # Mark not seen as absent
+        await self.services.user.mark_absent_except(seen)
         # Remove effectively absent
         if not self.config.keep_absent_users:
             await self.services.user.remove_absent()
@@ -473,7 +707,7 @@ class Overlord(discord.Client):
             ext.start()
         # Check config value
         await self.on_config_update()
-        self._initialized = True
+        self._mark_initialized()
         # Call 'on_ready' extension handlers
         await self._run_call_plan('on_ready')
         # Report success
@@ -495,6 +729,7 @@ class Overlord(discord.Client):
             if self.get_role(role_name) is None:
                 raise InvalidConfigException(f"No such role: '{role_name}'", self.config.control.path(f'roles[{i}]'))
         self.update_command_cache()
+        self._configure_queues()
         # Attach control channel
         channel = self.get_channel(self.config.control.channel)
         if channel is None:
@@ -516,6 +751,8 @@ class Overlord(discord.Client):
             self.log_channel = channel
         # Call extension 'on_config_update' handlers
         await self._run_call_plan('on_config_update')
+        # Extensions may change subscriptions on config update
+        self._build_routing_index()
 
     @after_initialized
     @skip_bots
@@ -531,6 +768,9 @@ class Overlord(discord.Client):
             return
         if not self.is_guild_member_message(message):
             return
+        # Skip messages no extension is subscribed to before any db work
+        if not self.routes('on_message', message.channel.id):
+            return
         user = await self.services.user.get(message.author)
         # Skip non-existing users
         if user is None:
@@ -568,7 +808,9 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        if self.is_special_channel_id(payload.channel_id):
+        # Fetched copy is not updated by gateway
+        self._message_cache.pop(payload.message_id)
+        if self.is_special_channel_id(payload.channel_id) or not self.routes('on_message_edit', payload.channel_id):
             return
         # Call extension 'on_message_edit' handlers
         await self._run_call_plan('on_message_edit', payload)
@@ -580,7 +822,8 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        if self.is_special_channel_id(payload.channel_id):
+        self._message_cache.pop(payload.message_id)
+        if self.is_special_channel_id(payload.channel_id) or not self.routes('on_message_delete', payload.channel_id):
             return
         # Call extension 'on_message_delete' handlers
         await self._run_call_plan('on_message_delete', payload)
@@ -594,7 +837,7 @@ class Overlord(discord.Client):
 
             Saves user in database
         """
-        async with self.sync():
+        async with self.locks.user(member.id):
             # Add/update user
             user = await self.services.user.merge_member(member)
         # Call extension 'on_member_join' handlers
@@ -615,14 +858,14 @@ class Overlord(discord.Client):
                 before.name != after.name or
                 before.discriminator != after.discriminator):
             return
-        async with self.sync():
+        async with self.locks.user(after.id):
             # Skip absent
             user = await self.services.user.get(before)
             if user is None:
                 log.warning(f'{qualified_name(after)} does not exist in db! Skipping user update event!')
                 return
-            # Update user
-            await self.services.user.merge_member(after)
+            # Update user (deferred when write-behind is enabled)
+            await self.services.user.queue_member(after)
         # Call extension 'on_member_update' handlers
         await self._run_call_plan('on_member_update', OverlordMember(before, user), OverlordMember(after, user))
 
@@ -635,7 +878,7 @@ class Overlord(discord.Client):
 
             Removes user from database (or keep it, depends on config)
         """
-        async with self.sync():
+        async with self.locks.user(member.id):
             if self.config.keep_absent_users:
                 user = await self.services.user.make_user_absent(member)
                 if user is None:
@@ -656,7 +899,8 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        await self.sync_users()
+        async with self.sync():
+            await self.services.role.add_role(role)
         # Call extension 'on_guild_role_create' handlers
         await self._run_call_plan('on_guild_role_create', OverlordRole(role, self.services.role.get_d_role(role.name)))
 
@@ -667,7 +911,8 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        await self.sync_users()
+        async with self.sync():
+            await self.services.role.remove_role(role)
         # Call extension 'on_guild_role_delete' handlers
         await self._run_call_plan('on_guild_role_delete', OverlordRole(role, self.services.role.get_d_role(role.name)))
 
@@ -678,8 +923,9 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        await self.sync_users()
-        role = self.services.role.get_d_role(before.name)
+        async with self.sync():
+            await self.services.role.update_role(before, after)
+        role = self.services.role.get_d_role(after.name)
         # Call extension 'on_guild_role_update' handlers
         await self._run_call_plan('on_guild_role_update', OverlordRole(before, role), OverlordRole(after, role))
 
@@ -690,21 +936,13 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        try:
-            # Resolve member, channel, message
-            member = await self.guild.fetch_member(payload.user_id)
-            channel = await self.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-        except discord.NotFound:
-            return
-        if member.bot:
+        resolved = await self._resolve_reaction(payload, 'reaction_add')
+        if resolved is None:
             return
+        member, message, control = resolved
         # handle control reactions
-        if channel == self.control_channel or (
-                member == self.maintainer and isinstance(channel, discord.DMChannel)):
+        if control:
             return await self.on_control_reaction_add(member, message, payload.emoji)
-        if not self.is_guild_member_message(message):
-            return
         user = await self.services.user.get(member)
         if user is None:
             log.warning(f'{qualified_name(message.author)} does not exist in db! Skipping new reaction event!')
@@ -732,22 +970,14 @@ class Overlord(discord.Client):
 
             Saves event in database
         """
-        try:
-            # Resolve member, channel, message
-            member = await self.guild.fetch_member(payload.user_id)
-            channel = await self.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-        except discord.NotFound:
-            return
-        if member.bot:
+        resolved = await self._resolve_reaction(payload, 'reaction_remove')
+        if resolved is None:
             return
+        member, message, control = resolved
         # handle control reactions
-        if channel == self.control_channel or (
-                member == self.maintainer and isinstance(channel, discord.DMChannel)):
+        if control:
             await self.on_control_reaction_remove(member, message, payload.emoji)
             return
-        if not self.is_guild_member_message(message):
-            return
         user = await self.services.user.get(member)
         if user is None:
             log.warning(f'{qualified_name(message.author)} does not exist in db! Skipping new reaction event!')
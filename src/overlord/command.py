@@ -152,7 +152,7 @@ class OverlordCommand(IOverlordCommand):
         if user is None:
             return None
         try:
-            d_user = await ext.bot.fetch_user(user.did)
+            d_user = await ext.bot.resolve_d_user(user.did)
         except DIS.NotFound:
             await fb.channel.send(R.MESSAGE.D_ERROR.UNKNOWN_USER)
             return None
@@ -165,7 +165,7 @@ class OverlordCommand(IOverlordCommand):
         if user is None:
             return None
         try:
-            member = await ext.bot.guild.fetch_member(user.id)
+            member = await ext.bot.resolve_member(user.id)
         except DIS.NotFound:
             await fb.channel.send(R.MESSAGE.D_ERROR.USER_NOT_MEMBER)
             return None
@@ -32,7 +32,7 @@ import asyncio
 import logging
 import sys
 import traceback
-from typing import Dict, List, Optional, Callable, Awaitable
+from typing import Dict, List, Optional, Callable, Awaitable, Set
 
 import discord
 from discord.errors import InvalidArgument
@@ -41,7 +41,8 @@ from discord.ext.tasks import Loop
 from overlord.bot import Overlord
 from overlord.task import OverlordTask
 from overlord.command import OverlordCommand
-from overlord.types import IBotExtension
+from overlord.queue import ExtensionQueue
+from overlord.types import IBotExtension, OverlordQueueConfig
 from util.exceptions import InvalidConfigException
 from util.extbot import ProgressEmbed, get_coroutine_attrs
 from util.resources import STRINGS as R
@@ -61,6 +62,8 @@ class BotExtension(IBotExtension):
     __color__ = 0x7B838A
 
     _skip_init_lock = ['on_config_update', 'on_ready', 'on_error']
+    # Default handlers doing nothing unless overridden
+    _noop_handlers = ['on_ready']
 
     # Members passed via constructor
     _bot: Overlord
@@ -72,12 +75,15 @@ class BotExtension(IBotExtension):
     _command_handlers: Dict[str, Callable[..., Awaitable[None]]]
     _task_instances: List[Loop]
     _async_lock: asyncio.Lock
+    # Optional own event queue (handlers run outside of discord.py event task)
+    _queue: Optional[ExtensionQueue]
 
     def __init__(self, bot: Overlord, priority=None) -> None:
         super().__init__()
         self._bot = bot
         self._enabled = False
         self._async_lock = asyncio.Lock()
+        self._queue = None
 
         attrs = [getattr(self, attr) for attr in dir(self) if not attr.startswith('_')]
 
@@ -92,7 +98,8 @@ class BotExtension(IBotExtension):
         # Reattach implemented handlers
         handlers = get_coroutine_attrs(self, name_filter=lambda x: x.startswith('on_'))
         for h_name, h in handlers.items():
-            setattr(self, h_name, self._handler(h))
+            if self.handles(h_name):
+                setattr(self, h_name, self._handler(h))
 
         # Prioritize
         if priority is not None:
@@ -113,13 +120,22 @@ class BotExtension(IBotExtension):
             except asyncio.CancelledError:
                 pass
 
+    async def _dispatch(self, func: Callable[..., Awaitable[None]], *args, **kwargs) -> None:
+        if not self._enabled:
+            return
+        if not self.bot.initialized and func.__name__ not in BotExtension._skip_init_lock:
+            await self.bot.init_lock()
+        await self.run_handler(func, *args, **kwargs)
+
     def _handler(self, func: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
         async def wrapped(*args, **kwargs):
             if not self._enabled:
                 return
-            if func.__name__ not in BotExtension._skip_init_lock:
-                await self.bot.init_lock()
-            await self.run_handler(func, *args, **kwargs)
+            # Lifecycle handlers always run inline
+            if self._queue is not None and func.__name__ not in BotExtension._skip_init_lock:
+                await self._queue.put(func.__name__, self._dispatch, func, *args, **kwargs)
+                return
+            await self._dispatch(func, *args, **kwargs)
         return wrapped
 
     @staticmethod
@@ -129,7 +145,8 @@ class BotExtension(IBotExtension):
         def decorator(func: Callable[..., Awaitable[None]]) -> OverlordTask:
 
             async def wrapped(self, *args, **kwargs) -> None:
-                await self.bot.init_lock()
+                if not self.bot.initialized:
+                    await self.bot.init_lock()
                 await func(self, *args, **kwargs)
 
             return OverlordTask(wrapped, seconds=seconds, minutes=minutes, hours=hours, count=count,
@@ -166,6 +183,14 @@ class BotExtension(IBotExtension):
         self._enabled = False
         for task in self._task_instances:
             task.stop()
+        if self._queue is not None:
+            self._queue.cancel()
+
+    async def shutdown(self) -> None:
+        """
+            Stops extension and waits for its pending work to finish (called on logout)
+        """
+        self.stop()
 
     def sync(self) -> asyncio.Lock:
         return self._async_lock
@@ -193,6 +218,42 @@ class BotExtension(IBotExtension):
             return self._command_handlers[name]
         return None
 
+    def handles(self, event: str) -> bool:
+        """
+            Checks whether extension implements event handler
+
+            Inherited no-op defaults are not considered implemented
+        """
+        if not hasattr(self, event):
+            return False
+        if event in BotExtension._noop_handlers:
+            return getattr(type(self), event) is not getattr(BotExtension, event)
+        return True
+
+    def subscriptions(self, event: str) -> Optional[Set[int]]:
+        """
+            Returns channel ids extension handles event for (None means any channel)
+
+            Used by bot routing index for channel scoped events, see Overlord.ROUTED_EVENTS
+        """
+        return None
+
+    def configure_queue(self, config: Optional[OverlordQueueConfig]) -> None:
+        """
+            Enables, reconfigures or disables own event queue
+
+            Disabled queue is drained by its workers, new events are handled inline
+        """
+        if config is None or not config.enabled:
+            if self._queue is not None:
+                self._queue.close()
+                self._queue = None
+            return
+        if self._queue is None:
+            self._queue = ExtensionQueue(type(self).__name__, config.size, config.workers, config.overflow)
+        else:
+            self._queue.configure(config.size, config.workers, config.overflow)
+
     def new_progress(self, name: str):
         embed = self.bot.new_embed('', '')
         return ProgressEmbed(name, embed)
@@ -205,6 +266,10 @@ class BotExtension(IBotExtension):
     def enabled(self) -> bool:
         return self._enabled
 
+    @property
+    def queue(self) -> Optional[ExtensionQueue]:
+        return self._queue
+
     ####################
     # Default Handlers #
     ####################
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Awaitable, Dict, Hashable, Optional, Set, Tuple
+
+import discord
+
+from .types import OverlordUser
+
+log = logging.getLogger('overlord-queue')
+
+
+class ExtensionQueue(object):
+    """
+        Bounded asyncio queue with own worker pool
+
+        Isolates extension handlers from discord.py event task. Overflow policies:
+            drop     - new call is discarded
+            block    - caller waits for free slot (backpressure)
+            coalesce - pending call of the same handler for the same event key
+                       (message or member id) is replaced (update events keep
+                       pending 'before' state and take new 'after' state),
+                       caller waits for free slot if there is none
+    """
+
+    DROP = 'drop'
+    BLOCK = 'block'
+    COALESCE = 'coalesce'
+    OVERFLOW_POLICIES = [DROP, BLOCK, COALESCE]
+
+    name: str
+    max_size: int
+    max_workers: int
+    overflow: str
+
+    # (handler name, event key, call, args, kwargs, enqueue time)
+    _items: 'deque[Tuple[str, Optional[Hashable], Callable[..., Awaitable[None]], tuple, dict, float]]'
+    _workers: Set[asyncio.Task]
+    _not_empty: asyncio.Event
+    _not_full: asyncio.Event
+    _closed: bool
+
+    # Metrics
+    _active: int
+    _max_depth: int
+    _enqueued: int
+    _processed: int
+    _dropped: int
+    _coalesced: int
+    _wait_time: float
+
+    def __init__(self, name: str, max_size: int = 256, workers: int = 1, overflow: str = BLOCK) -> None:
+        self.name = name
+        self._items = deque()
+        self._workers = set()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._closed = False
+        self._active = 0
+        self._max_depth = 0
+        self._enqueued = 0
+        self._processed = 0
+        self._dropped = 0
+        self._coalesced = 0
+        self._wait_time = 0.0
+        self.configure(max_size, workers, overflow)
+
+    ###########
+    # Getters #
+    ###########
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    @property
+    def full(self) -> bool:
+        return len(self._items) >= self.max_size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'depth': len(self._items),
+            'max_depth': self._max_depth,
+            'size': self.max_size,
+            'workers': len(self._workers),
+            'max_workers': self.max_workers,
+            'active': self._active,
+            'overflow': self.overflow,
+            'enqueued': self._enqueued,
+            'processed': self._processed,
+            'dropped': self._dropped,
+            'coalesced': self._coalesced,
+            'avg_wait': self._wait_time / self._processed if self._processed else 0.0
+        }
+
+    ################
+    # Sync methods #
+    ################
+
+    def configure(self, max_size: int, workers: int, overflow: str) -> None:
+        if max_size < 1:
+            raise ValueError(f'queue size should be positive, got: {max_size}')
+        if workers < 1:
+            raise ValueError(f'worker count should be positive, got: {workers}')
+        if overflow not in ExtensionQueue.OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy: {overflow}')
+        self.max_size = max_size
+        self.max_workers = workers
+        self.overflow = overflow
+        if not self.full:
+            self._not_full.set()
+        # Excess workers exit on their own, missing ones are spawned on demand
+        self._not_empty.set()
+
+    def close(self) -> None:
+        """
+            Stops accepting calls, workers exit after pending calls are done
+        """
+        self._closed = True
+        self._not_empty.set()
+        self._not_full.set()
+
+    def cancel(self) -> None:
+        """
+            Drops pending calls and cancels workers
+        """
+        self._items.clear()
+        self._not_full.set()
+        for worker in list(self._workers):
+            worker.cancel()
+        self._workers.clear()
+
+    def _spawn_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        while len(self._workers) < min(self.max_workers, self._active + len(self._items)):
+            self._workers.add(loop.create_task(self._worker()))
+
+    @staticmethod
+    def event_key(args: tuple) -> Optional[Hashable]:
+        """
+            Returns id of message or member event is about (None if there is no such)
+        """
+        for arg in args:
+            if isinstance(arg, OverlordUser):
+                arg = arg.discord
+            if isinstance(arg, discord.Message):
+                return 'message', arg.id
+            if isinstance(arg, (discord.Member, discord.User)):
+                return 'member', arg.id
+            message_id = getattr(arg, 'message_id', None)
+            if message_id is not None:
+                return 'message', message_id
+        return None
+
+    def _coalesce(self, name: str, key: Optional[Hashable], call: Callable[..., Awaitable[None]],
+                  args: tuple, kwargs: dict) -> bool:
+        if key is None:
+            return False
+        for i, item in enumerate(self._items):
+            if item[0] == name and item[1] == key:
+                # (before, after) pair: changes from pending 'before' up to new 'after'
+                if name.endswith('_update'):
+                    args = item[3][:-1] + args[-1:]
+                self._items[i] = (name, key, call, args, kwargs, item[5])
+                self._coalesced += 1
+                return True
+        return False
+
+    #################
+    # Async methods #
+    #################
+
+    async def put(self, name: str, call: Callable[..., Awaitable[None]], *args, **kwargs) -> bool:
+        """
+            Enqueues call, returns False if it was dropped
+        """
+        if self._closed:
+            return False
+        key = ExtensionQueue.event_key(args)
+        if self.full:
+            if self.overflow == ExtensionQueue.DROP:
+                self._dropped += 1
+                log.warning(f'{self.name} queue is full, {name} call dropped')
+                return False
+            # Calls without pending call for the same event are never lost
+            if self.overflow == ExtensionQueue.COALESCE and self._coalesce(name, key, call, args, kwargs):
+                self._enqueued += 1
+                return True
+            while self.full and not self._closed:
+                self._not_full.clear()
+                await self._not_full.wait()
+            if self._closed:
+                return False
+        self._items.append((name, key, call, args, kwargs, time.perf_counter()))
+        self._enqueued += 1
+        self._max_depth = max(self._max_depth, len(self._items))
+        self._not_empty.set()
+        self._spawn_workers()
+        return True
+
+    async def _worker(self) -> None:
+        me = asyncio.current_task()
+        try:
+            # Cancelled workers are removed from pool
+            while me in self._workers:
+                while not self._items:
+                    if self._closed or me not in self._workers or len(self._workers) > self.max_workers:
+                        return
+                    self._not_empty.clear()
+                    await self._not_empty.wait()
+                if me not in self._workers or len(self._workers) > self.max_workers:
+                    return
+                name, _, call, args, kwargs, enqueued_at = self._items.popleft()
+                self._not_full.set()
+                self._wait_time += time.perf_counter() - enqueued_at
+                self._active += 1
+                try:
+                    await call(*args, **kwargs)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception(f'Unhandled error in {self.name} queue on {name}')
+                finally:
+                    self._active -= 1
+                    self._processed += 1
+        finally:
+            self._workers.discard(me)
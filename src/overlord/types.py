@@ -29,7 +29,7 @@ SOFTWARE.
 __author__ = "Mathtin"
 
 import asyncio
-from typing import Any, Dict, List, Callable, Awaitable, Optional
+from typing import Any, Dict, List, Callable, Awaitable, Optional, Set
 
 import discord as DIS
 
@@ -82,10 +82,40 @@ class OverlordControlConfig(ConfigView):
     channel: int = 0
 
 
+class OverlordQueueConfig(ConfigView):
+    """
+    queue {
+        enabled = ...
+        size = ...
+        workers = ...
+        overflow = "drop|block|coalesce"
+    }
+    """
+    enabled: bool = False
+    size: int = 256
+    workers: int = 1
+    overflow: str = "block"
+
+
+class OverlordDispatchConfig(ConfigView):
+    """
+    dispatch {
+        queue : OverlordQueueConfig
+        extensions {
+            ExtensionClassName : OverlordQueueConfig
+            ...
+        }
+    }
+    """
+    queue: OverlordQueueConfig = OverlordQueueConfig()
+    extensions: Dict[str, OverlordQueueConfig] = {}
+
+
 class OverlordRootConfig(ConfigView):
     """
     bot {
         control : OverlordControlConfig
+        dispatch : OverlordDispatchConfig
         egg_done = ...
         keep_absent_users = ...
         command {
@@ -95,6 +125,7 @@ class OverlordRootConfig(ConfigView):
     }
     """
     control: OverlordControlConfig = OverlordControlConfig()
+    dispatch: OverlordDispatchConfig = OverlordDispatchConfig()
     egg_done: str = "change this part"
     keep_absent_users: bool = True
     command: Dict[str, List[str]] = {}
@@ -153,6 +184,9 @@ class IBotExtension(object):
     def stop(self) -> None:
         raise NotImplementedError()
 
+    async def shutdown(self) -> None:
+        raise NotImplementedError()
+
     def sync(self) -> asyncio.Lock:
         raise NotImplementedError()
 
@@ -168,6 +202,19 @@ class IBotExtension(object):
     async def run_handler(self, coroutine: Callable[..., Awaitable[None]], *args, **kwargs):
         raise NotImplementedError()
 
+    def handles(self, event: str) -> bool:
+        raise NotImplementedError()
+
+    def configure_queue(self, config: Optional[OverlordQueueConfig]) -> None:
+        raise NotImplementedError()
+
+    def subscriptions(self, event: str) -> Optional[Set[int]]:
+        raise NotImplementedError()
+
+    @property
+    def queue(self) -> Any:
+        raise NotImplementedError()
+
     @property
     def priority(self) -> int:
         raise NotImplementedError()
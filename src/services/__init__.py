@@ -31,4 +31,5 @@ __author__ = "Mathtin"
 from .role import RoleService
 from .user import UserService
 from .playerprofile import PlayerProfileService
+from .mojang import MojangService
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import db as DB
+import db.converters as conv
+import db.queries as q
+from util.cache import TTLCache
+from util.mcuuid import MojangAPI, PlayerData, is_valid_minecraft_username
+from .service import DBService
+
+log = logging.getLogger('mojang-service')
+
+
+##########################
+# Service implementation #
+##########################
+
+class MojangService(DBService):
+
+    DB_CHUNK_SIZE = 500
+
+    # Members passed via constructor
+    api: MojangAPI
+
+    # State
+    ttl: int
+    negative_ttl: int
+    db_hits: int
+    _cache: TTLCache
+
+    def __init__(self, db: DB.DBConnection, api: MojangAPI,
+                 ttl: int = 86400,
+                 negative_ttl: int = 3600,
+                 maxsize: int = 8192) -> None:
+        super().__init__(db)
+        self.api = api
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.db_hits = 0
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def cache_key(username: str) -> str:
+        return username.lower()
+
+    def set_ttl(self, ttl: int, negative_ttl: int) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache.ttl = ttl
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._cache),
+            'memory_hits': self._cache.hits,
+            'db_hits': self.db_hits,
+            'misses': self._cache.misses - self.db_hits
+        }
+
+    def _entry_ttl(self, player: PlayerData) -> int:
+        return self.ttl if player.valid else self.negative_ttl
+
+    async def _load_cached(self, key: str) -> Optional[PlayerData]:
+        row = await self.get_optional(q.select_player_name_cache(key))
+        now = int(time.time())
+        if row is None or row.expires_at <= now:
+            return None
+        player = PlayerData.from_profile(row.ign, row.uuid)
+        self._cache.set(key, player, row.expires_at - now)
+        return player
+
+    async def _store(self, key: str, player: PlayerData) -> None:
+        ttl = self._entry_ttl(player)
+        if ttl <= 0:
+            return
+        self._cache.set(key, player, ttl)
+        row = conv.player_name_cache_row(key, player, int(time.time()) + ttl)
+        await self.upsert_deferred(DB.PlayerNameCache, row, 'name')
+
+    async def resolve(self, identifier: str) -> PlayerData:
+        # Only usernames are cached
+        if not is_valid_minecraft_username(identifier):
+            return await self.api.player_data(identifier)
+        key = self.cache_key(identifier)
+        # Memory
+        player = self._cache.get(key)
+        if player is not None:
+            return player
+        # Database
+        player = await self._load_cached(key)
+        if player is not None:
+            self.db_hits += 1
+            return player
+        # Network
+        log.debug(f'Resolving {identifier}')
+        player = await self.api.player_data(identifier)
+        await self._store(key, player)
+        return player
+
+    async def resolve_many(self, usernames: Iterable[str]) -> Dict[str, PlayerData]:
+        """
+            Resolve usernames in bulk
+
+            Looks up memory and database caches first, remaining names are resolved
+            via Mojang bulk endpoint. Returns player data keyed by lower-cased username
+        """
+        res = {}
+        keys = {self.cache_key(u) for u in usernames if is_valid_minecraft_username(u)}
+        # Memory
+        for key in keys:
+            player = self._cache.get(key)
+            if player is not None:
+                res[key] = player
+        # Database
+        missing = [k for k in keys if k not in res]
+        now = int(time.time())
+        for i in range(0, len(missing), self.DB_CHUNK_SIZE):
+            for row in await self.get_list(q.select_player_name_cache_by_names(missing[i:i + self.DB_CHUNK_SIZE])):
+                if row.expires_at <= now:
+                    continue
+                player = PlayerData.from_profile(row.ign, row.uuid)
+                self._cache.set(row.name, player, row.expires_at - now)
+                res[row.name] = player
+                self.db_hits += 1
+        # Network
+        missing = [k for k in keys if k not in res]
+        if not missing:
+            return res
+        log.info(f'Resolving {len(missing)} names')
+        resolved = await self.api.players_data(missing)
+        rows = []
+        for key, player in resolved.items():
+            res[key] = player
+            ttl = self._entry_ttl(player)
+            if ttl <= 0:
+                continue
+            self._cache.set(key, player, ttl)
+            rows.append(conv.player_name_cache_row(key, player, now + ttl))
+        await self.merge_all(DB.PlayerNameCache, rows, 'name')
+        return res
+
+    async def clear_expired(self) -> None:
+        await self.execute(q.delete_expired_player_name_cache(int(time.time())))
+
+    async def clear_all(self) -> None:
+        self._cache.clear()
+        await self.execute(q.delete_all(DB.PlayerNameCache))
+
+    async def close(self) -> None:
+        await self.api.close()
@@ -28,8 +28,9 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+import json
 import logging
-from typing import Optional, Union, List
+from typing import Dict, Iterable, Optional, Union, List, Tuple
 from uuid import UUID
 
 import discord
@@ -44,6 +45,93 @@ from .user import UserService
 log = logging.getLogger('user-service')
 
 
+###################
+# Whitelist index #
+###################
+
+class WhitelistIndex(object):
+    """
+        Ordered in-memory view of whitelisted profiles
+
+        Keeps encoded json entry per profile (ordered by id) and
+        caches whole whitelist document until next change
+    """
+
+    loaded: bool
+    version: int
+    _entries: Dict[int, str]
+    _content: Optional[bytes]
+
+    def __init__(self) -> None:
+        self.loaded = False
+        self.version = 0
+        self._entries = {}
+        self._content = None
+
+    @staticmethod
+    def is_whitelisted(profile: DB.PlayerProfile) -> bool:
+        return not profile.banned
+
+    @staticmethod
+    def _encode_entry(profile: DB.PlayerProfile) -> str:
+        entry = json.dumps({"uuid": profile.uuid, "name": profile.ign}, indent=4)
+        return '\n'.join('    ' + line for line in entry.split('\n'))
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self.loaded = False
+        self._entries = {}
+        self._content = None
+
+    def load(self, profiles: Iterable[DB.PlayerProfile], version: int) -> bool:
+        """
+            Fills index with profiles fetched while index had given version
+
+            Returns False if index was changed meanwhile (profiles are stale)
+        """
+        if version != self.version:
+            return False
+        self._entries = {p.id: self._encode_entry(p) for p in sorted(profiles, key=lambda p: p.id)}
+        self._content = None
+        self.loaded = True
+        return True
+
+    def put(self, profile: DB.PlayerProfile) -> None:
+        self.version += 1
+        if not self.loaded:
+            return
+        if not self.is_whitelisted(profile):
+            self.discard(profile.id)
+            return
+        entry = self._encode_entry(profile)
+        if self._entries.get(profile.id) == entry:
+            return
+        if profile.id not in self._entries and self._entries and profile.id < next(reversed(self._entries)):
+            # Keep id order for (unlikely) out of order inserts
+            self._entries[profile.id] = entry
+            self._entries = dict(sorted(self._entries.items()))
+        else:
+            self._entries[profile.id] = entry
+        self._content = None
+
+    def discard(self, pk: int) -> None:
+        self.version += 1
+        if self._entries.pop(pk, None) is not None:
+            self._content = None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            if not self._entries:
+                self._content = b'[]'
+            else:
+                self._content = ('[\n' + ',\n'.join(self._entries.values()) + '\n]').encode()
+        return self._content
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 ##########################
 # Service implementation #
 ##########################
@@ -54,9 +142,14 @@ class PlayerProfileService(DBService):
     db: DB.DBConnection
     users: UserService
 
+    _whitelist: WhitelistIndex
+
     def __init__(self, db: DB.DBConnection, users: UserService) -> None:
         super().__init__(db)
         self.users = users
+        self._whitelist = WhitelistIndex()
+        # Profiles are cascaded with users
+        users.add_removal_listener(self._whitelist.invalidate)
 
     def get_all_sync(self, d_user: Union[discord.User, discord.Member, DB.User] = None) -> List[DB.PlayerProfile]:
         if d_user is None:
@@ -92,6 +185,29 @@ class PlayerProfileService(DBService):
             return await self.get_list(q.select_player_profiles_by_did_whitelisted(d_user.did))
         return await self.get_list(q.select_player_profiles_by_did_whitelisted(d_user.id))
 
+    def get_whitelist_content_sync(self) -> bytes:
+        while not self._whitelist.loaded:
+            version = self._whitelist.version
+            self._whitelist.load(self.get_list_sync(q.select_player_profiles_whitelisted()), version)
+        return self._whitelist.content
+
+    async def get_whitelist_content(self) -> bytes:
+        """
+            Returns encoded whitelist.json document
+
+            Served from in-memory index, DB is queried only after invalidation
+        """
+        while not self._whitelist.loaded:
+            version = self._whitelist.version
+            self._whitelist.load(await self.get_list(q.select_player_profiles_whitelisted()), version)
+        return self._whitelist.content
+
+    def get_persistent_sync(self) -> List[DB.PlayerProfile]:
+        return self.get_list_sync(q.select_player_profiles_persistent())
+
+    async def get_persistent(self) -> List[DB.PlayerProfile]:
+        return await self.get_list(q.select_player_profiles_persistent())
+
     def get_by_ign_sync(self, ign: str) -> Optional[DB.PlayerProfile]:
         return self.get_optional_sync(q.select_player_profile_by_ign(ign))
 
@@ -111,31 +227,94 @@ class PlayerProfileService(DBService):
         return await self.get_optional(q.select_player_profile_by_message_did(did))
 
     def add_profile_sync(self, user: DB.User, player: PlayerData, msg: discord.Message) -> DB.PlayerProfile:
-        return self.create_sync(DB.PlayerProfile, conv.player_profile_row(user, player, msg))
+        profile = self.create_sync(DB.PlayerProfile, conv.player_profile_row(user, player, msg))
+        self._whitelist.put(profile)
+        return profile
 
     async def add_profile(self, user: DB.User, player: PlayerData, msg: discord.Message) -> DB.PlayerProfile:
-        return await self.create(DB.PlayerProfile, conv.player_profile_row(user, player, msg))
+        profile = await self.create(DB.PlayerProfile, conv.player_profile_row(user, player, msg))
+        self._whitelist.put(profile)
+        return profile
 
     def add_persistent_profile_sync(self, user: DB.User, player: PlayerData) -> DB.PlayerProfile:
-        return self.create_sync(DB.PlayerProfile, conv.persistent_player_profile_row(user, player))
+        profile = self.create_sync(DB.PlayerProfile, conv.persistent_player_profile_row(user, player))
+        self._whitelist.put(profile)
+        return profile
 
     async def add_persistent_profile(self, user: DB.User, player: PlayerData) -> DB.PlayerProfile:
-        return await self.create(DB.PlayerProfile, conv.persistent_player_profile_row(user, player))
+        profile = await self.create(DB.PlayerProfile, conv.persistent_player_profile_row(user, player))
+        self._whitelist.put(profile)
+        return profile
+
+    def save_sync(self, profile: DB.PlayerProfile) -> DB.PlayerProfile:
+        profile = super().save_sync(profile)
+        self._whitelist.put(profile)
+        return profile
+
+    async def save(self, profile: DB.PlayerProfile) -> DB.PlayerProfile:
+        profile = await super().save(profile)
+        self._whitelist.put(profile)
+        return profile
 
     def remove_sync(self, profile: DB.PlayerProfile) -> None:
         self.delete_sync(DB.PlayerProfile, profile.id)
+        self._whitelist.discard(profile.id)
 
     async def remove(self, profile: DB.PlayerProfile) -> None:
         await self.delete(DB.PlayerProfile, profile.id)
+        self._whitelist.discard(profile.id)
 
     def clear_all_sync(self):
         self.execute_sync(q.delete_all(DB.PlayerProfile))
+        self._whitelist.invalidate()
 
     async def clear_all(self):
         await self.execute(q.delete_all(DB.PlayerProfile))
+        self._whitelist.invalidate()
+
+    @staticmethod
+    def _split_reload_rows(profiles: List[Tuple[DB.User, PlayerData, discord.Message]],
+                           persistent_uuids: List[str]) -> Tuple[List[dict], List[dict]]:
+        rows = [conv.player_profile_row(*p) for p in profiles]
+        persistent_uuids = set(persistent_uuids)
+        new_rows = [r for r in rows if r['uuid'] not in persistent_uuids]
+        linked_rows = [{'b_uuid': r['uuid'], 'ign': r['ign'], 'profile': r['profile'], 'message_did': r['message_did']}
+                       for r in rows if r['uuid'] in persistent_uuids]
+        return new_rows, linked_rows
+
+    def replace_dynamic_sync(self, profiles: List[Tuple[DB.User, PlayerData, discord.Message]]) -> None:
+        with self.sync_session() as session:
+            with session.begin():
+                session.execute(q.delete_dynamic_profiles())
+                persistent = session.execute(q.select_player_profile_uuids_persistent()).scalars().all()
+                new_rows, linked_rows = self._split_reload_rows(profiles, persistent)
+                if new_rows:
+                    session.execute(q.insert_player_profiles(), new_rows)
+                if linked_rows:
+                    session.execute(q.update_player_profiles_by_uuid(), linked_rows)
+        self._whitelist.invalidate()
+
+    async def replace_dynamic(self, profiles: List[Tuple[DB.User, PlayerData, discord.Message]]) -> None:
+        """
+            Replaces all dynamic profiles in single transaction
+
+            Profiles matching persistent ones (by uuid) are linked to their messages instead
+        """
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(q.delete_dynamic_profiles())
+                persistent = (await session.execute(q.select_player_profile_uuids_persistent())).scalars().all()
+                new_rows, linked_rows = self._split_reload_rows(profiles, persistent)
+                if new_rows:
+                    await session.execute(q.insert_player_profiles(), new_rows)
+                if linked_rows:
+                    await session.execute(q.update_player_profiles_by_uuid(), linked_rows)
+        self._whitelist.invalidate()
 
     def clear_dynamic_sync(self):
         self.execute_sync(q.delete_dynamic_profiles())
+        self._whitelist.invalidate()
 
     async def clear_dynamic(self):
         await self.execute(q.delete_dynamic_profiles())
+        self._whitelist.invalidate()
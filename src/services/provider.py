@@ -28,11 +28,16 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+from typing import Optional
+
 from db import DBConnection
+from util.mcuuid import MojangAPI
 
+from .mojang import MojangService
 from .role import RoleService
 from .user import UserService
 from .playerprofile import PlayerProfileService
+from .service import WriteBehindQueue
 
 
 class ServiceProvider(object):
@@ -41,6 +46,9 @@ class ServiceProvider(object):
     _s_roles:            RoleService
     _s_users:            UserService
     _s_player_profiles:  PlayerProfileService
+    _s_mojang:           MojangService
+
+    _write_behind: Optional[WriteBehindQueue]
 
     def __init__(self, db: DBConnection):
         self._db = db
@@ -48,6 +56,19 @@ class ServiceProvider(object):
         self._s_roles = RoleService(self._db)
         self._s_users = UserService(self._db, self._s_roles)
         self._s_player_profiles = PlayerProfileService(self._db, self._s_users)
+        self._s_mojang = MojangService(self._db, MojangAPI())
+
+        # Single queue so flush() of any service is a barrier for all of them
+        self._write_behind = None
+        config = self._db.config
+        if config.write_behind:
+            self._write_behind = WriteBehindQueue(self._db, config.write_behind_size, config.write_behind_delay)
+            for service in (self._s_roles, self._s_users, self._s_player_profiles, self._s_mojang):
+                service.set_write_behind(self._write_behind)
+
+    @property
+    def db(self) -> DBConnection:
+        return self._db
 
     @property
     def role(self) -> RoleService:
@@ -60,3 +81,19 @@ class ServiceProvider(object):
     @property
     def player_profiles(self) -> PlayerProfileService:
         return self._s_player_profiles
+
+    @property
+    def mojang(self) -> MojangService:
+        return self._s_mojang
+
+    @property
+    def write_behind(self) -> Optional[WriteBehindQueue]:
+        return self._write_behind
+
+    async def flush(self) -> None:
+        if self._write_behind is not None:
+            await self._write_behind.flush()
+
+    async def close(self) -> None:
+        await self.flush()
+        await self._s_mojang.close()
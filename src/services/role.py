@@ -35,7 +35,7 @@ import db as DB
 import db.queries as q
 import db.converters as conv
 
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from .service import DBService
 
 log = logging.getLogger('role-service')
@@ -51,8 +51,21 @@ class RoleService(DBService):
     role_map: Dict[str, discord.Role]
     role_rows_did_map: Dict[int, Dict[str, Any]]
 
+    _mask_listeners: List[Callable[[], None]]
+
     def __init__(self, db: DB.DBConnection):
         super().__init__(db)
+        self._mask_listeners = []
+
+    def add_mask_listener(self, listener: Callable[[], None]) -> None:
+        """
+            Registers callback invoked after user role masks are changed in database
+        """
+        self._mask_listeners.append(listener)
+
+    def _notify_mask_change(self) -> None:
+        for listener in self._mask_listeners:
+            listener()
 
     def _load_state(self, roles: List[discord.Role]) -> List[Dict[str, Any]]:
         self.role_map = {role.name: role for role in roles}
@@ -65,15 +78,116 @@ class RoleService(DBService):
         # Sync table
         with self.sync_session() as session:
             with session.begin():
-                session.sync_table(DB.Role, 'did', role_rows)
+                session.sync_table(DB.Role, role_rows, pk_col='did')
 
     async def load(self, roles: List[discord.Role]) -> None:
+        await self.flush()
         role_rows = self._load_state(roles)
         # Sync table
         async with self.session() as session:
             async with session.begin():
                 await session.sync_table(DB.Role, role_rows, pk_col='did')
 
+    def encode_mask(self, roles: Iterable[discord.Role]) -> bytes:
+        return conv.encode_role_mask(self.role_rows_did_map[role.id]['idx'] for role in roles)
+
+    def decode_mask(self, mask: Optional[bytes]) -> List[int]:
+        """
+            Returns role dids encoded in user role mask
+        """
+        idx_did_map = {row['idx']: did for did, row in self.role_rows_did_map.items()}
+        return [idx_did_map[idx] for idx in conv.decode_role_mask(mask) if idx in idx_did_map]
+
+    @staticmethod
+    def _cleared_masks(masks: List[Any], idx: int) -> List[Dict[str, Any]]:
+        return [{'b_did': did, 'roles': conv.clear_role_mask_bit(mask, idx)} for did, mask in masks if mask is not None]
+
+    def _free_idx(self) -> int:
+        used = {row['idx'] for row in self.role_rows_did_map.values()}
+        idx = 0
+        while idx in used:
+            idx += 1
+        return idx
+
+    def _add_state(self, role: discord.Role) -> Dict[str, Any]:
+        row = conv.role_to_row(role)
+        row['idx'] = self._free_idx()
+        self.role_map[role.name] = role
+        self.role_rows_did_map[role.id] = row
+        return row
+
+    def _remove_state(self, role: discord.Role) -> Optional[Dict[str, Any]]:
+        d_role = self.role_map.get(role.name)
+        if d_role is not None and d_role.id == role.id:
+            del self.role_map[role.name]
+        return self.role_rows_did_map.pop(role.id, None)
+
+    def _update_state(self, before: discord.Role, after: discord.Role) -> Optional[Dict[str, Any]]:
+        row = self.role_rows_did_map.get(after.id)
+        if row is None:
+            return self._add_state(after)
+        self._remove_state(before)
+        self.role_map[after.name] = after
+        self.role_rows_did_map[after.id] = row
+        if row['name'] == after.name:
+            return None
+        row['name'] = after.name
+        return row
+
+    def add_role_sync(self, role: discord.Role) -> None:
+        self.merge_sync(DB.Role, self._add_state(role), 'did')
+
+    async def add_role(self, role: discord.Role) -> None:
+        """
+            Registers new role in lowest free index slot (new role has no members yet)
+        """
+        await self.merge(DB.Role, self._add_state(role), 'did')
+
+    def remove_role_sync(self, role: discord.Role) -> None:
+        row = self._remove_state(role)
+        if row is None:
+            return
+        with self.sync_session() as session:
+            with session.begin():
+                masks = session.execute(q.select_user_masks_with_role(role.id)).all()
+                params = self._cleared_masks(masks, row['idx'])
+                if params:
+                    session.execute(q.update_user_roles_by_did(), params)
+                session.execute(q.delete_user_roles_by_role(role.id))
+                session.execute(q.delete_role_by_did(role.id))
+        self._notify_mask_change()
+
+    async def remove_role(self, role: discord.Role) -> None:
+        """
+            Removes role and resets its bit in user role masks, freeing its index slot
+        """
+        await self.flush()
+        row = self._remove_state(role)
+        if row is None:
+            return
+        async with self.session() as session:
+            async with session.begin():
+                masks = (await session.execute(q.select_user_masks_with_role(role.id))).all()
+                params = self._cleared_masks(masks, row['idx'])
+                if params:
+                    await session.execute(q.update_user_roles_by_did(), params)
+                await session.execute(q.delete_user_roles_by_role(role.id))
+                await session.execute(q.delete_role_by_did(role.id))
+        self._notify_mask_change()
+
+    def update_role_sync(self, before: discord.Role, after: discord.Role) -> None:
+        row = self._update_state(before, after)
+        if row is not None:
+            self.merge_sync(DB.Role, row, 'did')
+
+    async def update_role(self, before: discord.Role, after: discord.Role) -> None:
+        """
+            Updates role name (role index and user masks are kept)
+        """
+        row = self._update_state(before, after)
+        if row is not None:
+            await self.merge(DB.Role, row, 'did')
+
     def get_d_role(self, role_name: str) -> Optional[discord.Role]:
         if role_name in self.role_map:
             return self.role_map[role_name]
@@ -89,4 +203,5 @@ class RoleService(DBService):
         self.execute_sync(q.delete_all(DB.Role))
 
     async def clear_all(self):
+        await self.flush()
         await self.execute(q.delete_all(DB.Role))
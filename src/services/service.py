@@ -28,15 +28,170 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+import asyncio
 import logging
-from typing import Any, Type, Dict, Optional, List
+from collections import OrderedDict
+from typing import Any, Type, Dict, Optional, List, Tuple
 
 import db as DB
+import db.queries as q
 from db.models.base import BaseModel
 
 log = logging.getLogger('event-service')
 
 
+######################
+# Write-behind queue #
+######################
+
+class WriteBehindQueue(object):
+    """
+        Buffers row writes and flushes them in grouped transactions
+
+        Writes are keyed by (model type, key column, key value). Pending upsert of
+        the same key is coalesced (later values override earlier ones), delete and
+        replace supersede any pending write of the key. Flush happens when max_size
+        writes are pending, max_delay seconds after first pending write or on
+        explicit flush() call (read-your-writes barrier). Failed flush is retried
+        by timer with exponential backoff (up to MAX_RETRY_DELAY seconds).
+    """
+
+    MAX_RETRY_DELAY = 60.0
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    # Delete rows by key column and insert new ones (child rows, e.g. user roles)
+    REPLACE = 'replace'
+
+    _db: DB.DBConnection
+    _pending: 'OrderedDict[Tuple[Type[BaseModel], str, Any], Tuple[str, Any]]'
+    _timer: Optional[asyncio.Task]
+
+    def __init__(self, db: DB.DBConnection, max_size: int = 500, max_delay: float = 1.0) -> None:
+        self._db = db
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._failures = 0
+        self.flushes = 0
+        self.written = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, model_type: Type[BaseModel], key: Any, key_col: str = 'id') -> bool:
+        return (model_type, key_col, key) in self._pending
+
+    async def _put(self, model_type: Type[BaseModel], key_col: str, key: Any, op: str, value: Any) -> None:
+        entry_key = (model_type, key_col, key)
+        pending = self._pending.get(entry_key)
+        if op == self.UPSERT and pending is not None and pending[0] == self.UPSERT:
+            pending[1].update(value)
+        else:
+            # Superseding write is moved to the end to keep order against other keys
+            self._pending.pop(entry_key, None)
+            self._pending[entry_key] = (op, dict(value) if op == self.UPSERT else value)
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+        else:
+            self._schedule(self.max_delay)
+
+    async def upsert(self, model_type: Type[BaseModel], value: Dict[str, Any], key_col: str = 'id') -> None:
+        await self._put(model_type, key_col, value[key_col], self.UPSERT, value)
+
+    async def delete(self, model_type: Type[BaseModel], key: Any, key_col: str = 'id') -> None:
+        await self._put(model_type, key_col, key, self.DELETE, None)
+
+    async def replace(self, model_type: Type[BaseModel], key: Any, rows: List[Dict[str, Any]], key_col: str) -> None:
+        await self._put(model_type, key_col, key, self.REPLACE, rows)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = asyncio.get_event_loop().create_task(self._flush_later(delay))
+
+    def _retry_delay(self) -> float:
+        return min(self.max_delay * 2 ** self._failures, self.MAX_RETRY_DELAY)
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            log.error(f'Write-behind flush failed: {e}')
+
+    def _statements(self, batch: List[Tuple[Tuple[Type[BaseModel], str, Any], Tuple[str, Any]]]) \
+            -> List[Tuple[str, Type[BaseModel], str, List[Any]]]:
+        """
+            Groups consecutive writes of the same kind (op, model, key column, columns)
+        """
+        groups = []
+        last = None
+        for (model_type, key_col, key), (op, value) in batch:
+            group = (op, model_type, key_col, tuple(value.keys()) if op == self.UPSERT else None)
+            if group != last:
+                groups.append((op, model_type, key_col, []))
+                last = group
+            groups[-1][3].append(value if op == self.UPSERT else (key, value))
+        return groups
+
+    async def _write(self, session, op: str, model_type: Type[BaseModel], key_col: str, items: List[Any]) -> None:
+        if op == self.UPSERT:
+            dialect = self._db.dialect
+            if dialect in ('postgresql', 'sqlite', 'mysql'):
+                await session.execute(q.upsert(model_type, dialect, key_col, list(items[0].keys())), items)
+            else:
+                for value in items:
+                    await session.merge(model_type=model_type, value=value, pk_col=key_col)
+            return
+        await session.execute(q.delete_by_keys(model_type, key_col, [key for key, _ in items]))
+        rows = [row for _, rows in items if rows for row in rows]
+        if op == self.REPLACE and rows:
+            await session.execute(q.insert_all(model_type), rows)
+
+    async def flush(self) -> None:
+        """
+            Writes all pending writes in single transaction
+        """
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            batch = list(self._pending.items())
+            self._pending = OrderedDict()
+            try:
+                async with self._db.async_session() as session:
+                    async with session.begin():
+                        for group in self._statements(batch):
+                            await self._write(session, *group)
+            except Exception:
+                # Keep failed writes unless superseded while flushing
+                restored = OrderedDict(batch)
+                for key, entry in self._pending.items():
+                    restored.pop(key, None)
+                    restored[key] = entry
+                self._pending = restored
+                # Kept writes are not left waiting for unrelated write or shutdown
+                self._failures += 1
+                self._schedule(self._retry_delay())
+                raise
+            self._failures = 0
+            self.flushes += 1
+            self.written += len(batch)
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
 ##########################
 # Service implementation #
 ##########################
@@ -46,9 +201,22 @@ class DBService(object):
     # Members passed via constructor
     _db: DB.DBConnection
 
+    # Shared between services (see ServiceProvider)
+    _write_behind: Optional[WriteBehindQueue] = None
+
     def __init__(self, db: DB.DBConnection) -> None:
         self._db = db
 
+    def set_write_behind(self, queue: Optional[WriteBehindQueue]) -> None:
+        self._write_behind = queue
+
+    async def flush(self) -> None:
+        """
+            Read-your-writes barrier: writes pending deferred writes
+        """
+        if self._write_behind is not None:
+            await self._write_behind.flush()
+
     def session(self):
         return self._db.async_session()
 
@@ -65,30 +233,47 @@ class DBService(object):
             async with session.begin():
                 await session.execute(stmt)
 
+    def execute_all_sync(self, stmts: List[Any]) -> None:
+        with self.sync_session() as session:
+            with session.begin():
+                for stmt in stmts:
+                    session.execute(stmt)
+
+    async def execute_all(self, stmts: List[Any]) -> None:
+        async with self.session() as session:
+            async with session.begin():
+                for stmt in stmts:
+                    await session.execute(stmt)
+
+    # Read path: objects are fully loaded by the query itself (including joined relations),
+    # so they are expunged without refresh (detach would issue extra SELECT per object)
+
     def get_optional_sync(self, stmt: Any) -> Any:
         with self.sync_session() as session:
             obj = session.execute(stmt).scalar_one_or_none()
-            session.detach(obj)
+            if obj is not None:
+                session.expunge(obj)
             return obj
 
     async def get_optional(self, stmt: Any) -> Any:
         async with self.session() as session:
             obj = (await session.execute(stmt)).scalar_one_or_none()
-            await session.detach(obj)
+            if obj is not None:
+                session.expunge(obj)
             return obj
 
     def get_list_sync(self, stmt: Any) -> List[Any]:
         with self.sync_session() as session:
             obj = [r for r, in session.execute(stmt)]
             for r in obj:
-                session.detach(r)
+                session.expunge(r)
             return obj
 
     async def get_list(self, stmt: Any) -> List[Any]:
         async with self.session() as session:
             obj = []
             async for r, in await session.stream(stmt):
-                await session.detach(r)
+                session.expunge(r)
                 obj.append(r)
             return obj
 
@@ -124,6 +309,81 @@ class DBService(object):
             await session.detach(obj)
         return obj
 
+    def merge_all_sync(self, model_type: Type[BaseModel],
+                       values: List[Dict[str, Any]],
+                       pk_col: str = 'id') -> None:
+        with self.sync_session() as session:
+            with session.begin():
+                for value in values:
+                    session.merge(model_type=model_type, value=value, pk_col=pk_col)
+
+    async def merge_all(self, model_type: Type[BaseModel],
+                        values: List[Dict[str, Any]],
+                        pk_col: str = 'id') -> None:
+        async with self.session() as session:
+            async with session.begin():
+                for value in values:
+                    await session.merge(model_type=model_type, value=value, pk_col=pk_col)
+
+    def _upsert_statement(self, model_type: Type[BaseModel], values: List[Dict[str, Any]], key_col: str) -> Any:
+        if self._db.dialect not in ('postgresql', 'sqlite', 'mysql'):
+            return None
+        return q.upsert(model_type, self._db.dialect, key_col, list(values[0].keys()))
+
+    def upsert_all_sync(self, model_type: Type[BaseModel],
+                        values: List[Dict[str, Any]],
+                        key_col: str = 'id') -> None:
+        if not values:
+            return
+        stmt = self._upsert_statement(model_type, values, key_col)
+        if stmt is None:
+            return self.merge_all_sync(model_type, values, key_col)
+        with self.sync_session() as session:
+            with session.begin():
+                session.execute(stmt, values)
+
+    async def upsert_all(self, model_type: Type[BaseModel],
+                         values: List[Dict[str, Any]],
+                         key_col: str = 'id') -> None:
+        """
+            Inserts or updates (by unique key_col) rows with single executemany statement
+
+            Falls back to merge_all for dialects without upsert support
+        """
+        if not values:
+            return
+        stmt = self._upsert_statement(model_type, values, key_col)
+        if stmt is None:
+            return await self.merge_all(model_type, values, key_col)
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(stmt, values)
+
+    # Deferred writes: queued when write-behind is enabled, applied immediately otherwise
+
+    async def upsert_deferred(self, model_type: Type[BaseModel],
+                              value: Dict[str, Any],
+                              key_col: str = 'id') -> None:
+        if self._write_behind is None:
+            return await self.upsert_all(model_type, [value], key_col)
+        await self._write_behind.upsert(model_type, value, key_col)
+
+    async def delete_deferred(self, model_type: Type[BaseModel], key: Any, key_col: str = 'id') -> None:
+        if self._write_behind is None:
+            return await self.execute(q.delete_by_keys(model_type, key_col, [key]))
+        await self._write_behind.delete(model_type, key, key_col)
+
+    async def replace_deferred(self, model_type: Type[BaseModel],
+                               key: Any,
+                               rows: List[Dict[str, Any]],
+                               key_col: str) -> None:
+        if self._write_behind is None:
+            stmts = [q.delete_by_keys(model_type, key_col, [key])]
+            if rows:
+                stmts.append(q.insert_all(model_type).values(rows))
+            return await self.execute_all(stmts)
+        await self._write_behind.replace(model_type, key, rows, key_col)
+
     def save_sync(self, model: BaseModel) -> BaseModel:
         with self.sync_session() as session:
             with session.begin():
@@ -35,13 +35,98 @@ import db as DB
 import db.converters as conv
 import db.queries as q
 
-from typing import Optional, Union, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union, Tuple
+
+from util.cache import TTLCache
 from .role import RoleService
 from .service import DBService
 
 log = logging.getLogger('user-service')
 
 
+##############
+# Name index #
+##############
+
+class UserNameIndex(object):
+    """
+        In-memory did lookup by display name and qualified name (name#disc)
+
+        Filled by member writes, misses are resolved by database. Ambiguous
+        display names (shared by several users) are not resolved.
+    """
+
+    # did -> (name, disc, display_name)
+    _users: Dict[int, Tuple[str, int, Optional[str]]]
+    _display_names: Dict[str, Set[int]]
+    _q_names: Dict[Tuple[str, int], int]
+
+    def __init__(self) -> None:
+        self._users = {}
+        self._display_names = {}
+        self._q_names = {}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _unlink_display_name(self, did: int, display_name: Optional[str]) -> None:
+        if display_name is None:
+            return
+        dids = self._display_names.get(display_name)
+        if dids is not None:
+            dids.discard(did)
+            if not dids:
+                del self._display_names[display_name]
+
+    def put(self, did: int, name: str, disc: int, display_name: Optional[str]) -> None:
+        self.discard(did)
+        self._users[did] = (name, disc, display_name)
+        self._q_names[(name, disc)] = did
+        if display_name is not None:
+            self._display_names.setdefault(display_name, set()).add(did)
+
+    def put_row(self, row: Dict[str, Any]) -> None:
+        self.put(row['did'], row['name'], row['disc'], row['display_name'])
+
+    def discard(self, did: int) -> None:
+        entry = self._users.pop(did, None)
+        if entry is None:
+            return
+        name, disc, display_name = entry
+        if self._q_names.get((name, disc)) == did:
+            del self._q_names[(name, disc)]
+        self._unlink_display_name(did, display_name)
+
+    def make_absent(self, did: int) -> None:
+        entry = self._users.get(did)
+        if entry is not None:
+            self._unlink_display_name(did, entry[2])
+            self._users[did] = (entry[0], entry[1], None)
+
+    def make_absent_except(self, dids: Optional[Set[int]] = None) -> None:
+        for did in list(self._users):
+            if dids is None or did not in dids:
+                self.make_absent(did)
+
+    def discard_absent(self) -> None:
+        for did in [did for did, entry in self._users.items() if entry[2] is None]:
+            self.discard(did)
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._display_names.clear()
+        self._q_names.clear()
+
+    def by_display_name(self, display_name: str) -> Optional[int]:
+        dids = self._display_names.get(display_name)
+        if dids is None or len(dids) != 1:
+            return None
+        return next(iter(dids))
+
+    def by_q_name(self, name: str, disc: int) -> Optional[int]:
+        return self._q_names.get((name, disc))
+
+
 ##########################
 # Service implementation #
 ##########################
@@ -52,9 +137,69 @@ class UserService(DBService):
     db: DB.DBConnection
     roles: RoleService
 
+    SYNC_CHUNK_SIZE = 500
+    IDENTITY_CACHE_SIZE = 4096
+    IDENTITY_CACHE_TTL = 600.0
+
+    _removal_listeners: List[Callable[[], None]]
+    # did -> detached DB.User snapshot (shared, must not be modified)
+    _identity: TTLCache
+    # Incremented on invalidation, rows read before it are not cached
+    _identity_epoch: int
+    _names: UserNameIndex
+
     def __init__(self, db: DB.DBConnection, roles: RoleService) -> None:
         super().__init__(db)
         self.roles = roles
+        self._removal_listeners = []
+        self._identity = TTLCache(maxsize=self.IDENTITY_CACHE_SIZE, ttl=self.IDENTITY_CACHE_TTL)
+        self._identity_epoch = 0
+        self._names = UserNameIndex()
+        self.roles.add_mask_listener(self._forget_all)
+
+    @property
+    def identity_cache(self) -> TTLCache:
+        return self._identity
+
+    @property
+    def name_index(self) -> UserNameIndex:
+        return self._names
+
+    def _cache_user(self, user: Optional[DB.User], epoch: int) -> Optional[DB.User]:
+        if user is not None and epoch == self._identity_epoch:
+            self._identity.set(user.did, user)
+        return user
+
+    def _forget(self, dids: Iterable[int]) -> None:
+        self._identity_epoch += 1
+        for did in dids:
+            self._identity.pop(did)
+
+    def _forget_all(self) -> None:
+        self._identity_epoch += 1
+        self._identity.clear()
+
+    def _cache_member_snapshot(self, d_user: discord.Member, row: Dict[str, Any]) -> None:
+        """
+            Replaces cached snapshot with queued (not yet written) member state
+        """
+        user = self._identity.peek(d_user.id)
+        if user is None:
+            return
+        snapshot = DB.User(id=user.id, created_at=user.created_at, updated_at=user.updated_at)
+        for col in ('did', 'name', 'disc', 'display_name', 'roles'):
+            setattr(snapshot, col, row[col] if col in row else getattr(user, col))
+        self._identity.set(d_user.id, snapshot)
+
+    def add_removal_listener(self, listener: Callable[[], None]) -> None:
+        """
+            Registers callback invoked after users are deleted (dependent rows are cascaded)
+        """
+        self._removal_listeners.append(listener)
+
+    def _notify_removal(self) -> None:
+        for listener in self._removal_listeners:
+            listener()
 
     @staticmethod
     def parse_qualified_name(qualified_name: str) -> Tuple[str, int]:
@@ -67,22 +212,72 @@ class UserService(DBService):
     def is_absent(user: DB.User) -> bool:
         return user.roles is None and user.display_name is None
 
+    def get_by_did_sync(self, did: int) -> Optional[DB.User]:
+        user = self._identity.get(did)
+        if user is not None:
+            return user
+        epoch = self._identity_epoch
+        return self._cache_user(self.get_optional_sync(q.select_user_by_did(did)), epoch)
+
+    async def get_by_did(self, did: int) -> Optional[DB.User]:
+        """
+            Read-through identity cache lookup (known users are served without database)
+        """
+        user = self._identity.get(did)
+        if user is not None:
+            return user
+        # Don't cache row which is about to be overwritten by queued write
+        if self._write_behind is not None and self._write_behind.is_pending(DB.User, did, 'did'):
+            await self.flush()
+        epoch = self._identity_epoch
+        return self._cache_user(await self.get_optional(q.select_user_by_did(did)), epoch)
+
     def get_sync(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
-        return self.get_optional_sync(q.select_user_by_did(d_user.id))
+        return self.get_by_did_sync(d_user.id)
 
     async def get(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
-        return await self.get_optional(q.select_user_by_did(d_user.id))
+        return await self.get_by_did(d_user.id)
+
+    def get_all_by_did_sync(self, dids: Iterable[int]) -> List[DB.User]:
+        return self.get_list_sync(q.select_users_by_dids(list(dids)))
+
+    async def get_all_by_did(self, dids: Iterable[int]) -> List[DB.User]:
+        return await self.get_list(q.select_users_by_dids(list(dids)))
+
+    def get_users_with_role_sync(self, role: Union[discord.Role, DB.Role]) -> List[DB.User]:
+        did = role.did if isinstance(role, DB.Role) else role.id
+        return self.get_list_sync(q.select_users_with_role(did))
+
+    async def get_users_with_role(self, role: Union[discord.Role, DB.Role]) -> List[DB.User]:
+        did = role.did if isinstance(role, DB.Role) else role.id
+        return await self.get_list(q.select_users_with_role(did))
+
+    # Name lookups resolve did by name index first, database is queried on index miss only
 
     def get_by_display_name_sync(self, display_name: str) -> Optional[DB.User]:
+        did = self._names.by_display_name(display_name)
+        if did is not None:
+            return self.get_by_did_sync(did)
         return self.get_optional_sync(q.select_user_by_display_name(display_name))
 
     async def get_by_display_name(self, display_name: str) -> Optional[DB.User]:
+        did = self._names.by_display_name(display_name)
+        if did is not None:
+            return await self.get_by_did(did)
+        await self.flush()
         return await self.get_optional(q.select_user_by_display_name(display_name))
 
     def get_by_q_name_sync(self, name: str, disc: int) -> Optional[DB.User]:
+        did = self._names.by_q_name(name, disc)
+        if did is not None:
+            return self.get_by_did_sync(did)
         return self.get_optional_sync(q.select_user_by_q_name(name, disc))
 
     async def get_by_q_name(self, name: str, disc: int) -> Optional[DB.User]:
+        did = self._names.by_q_name(name, disc)
+        if did is not None:
+            return await self.get_by_did(did)
+        await self.flush()
         return await self.get_optional(q.select_user_by_q_name(name, disc))
 
     def get_by_qualified_name_sync(self, qualified_name: str) -> Optional[DB.User]:
@@ -92,47 +287,176 @@ class UserService(DBService):
         return await self.get_by_q_name(*self.parse_qualified_name(qualified_name))
 
     def mark_everyone_absent_sync(self) -> None:
-        self.execute_sync(q.update_all_users_absent())
+        self.execute_all_sync([q.update_all_users_absent(), q.delete_all(DB.UserRole)])
+        self._forget_all()
+        self._names.make_absent_except()
 
     async def mark_everyone_absent(self) -> None:
-        await self.execute(q.update_all_users_absent())
+        await self.flush()
+        await self.execute_all([q.update_all_users_absent(), q.delete_all(DB.UserRole)])
+        self._forget_all()
+        self._names.make_absent_except()
+
+    def mark_absent_except_sync(self, dids: Set[int]) -> None:
+        with self.sync_session() as session:
+            with session.begin():
+                present = session.execute(q.select_present_user_dids()).scalars().all()
+                absent = [did for did in present if did not in dids]
+                for i in range(0, len(absent), self.SYNC_CHUNK_SIZE):
+                    chunk = absent[i:i + self.SYNC_CHUNK_SIZE]
+                    session.execute(q.update_users_absent_by_dids(chunk))
+                    session.execute(q.delete_user_roles_by_dids(chunk))
+        self._forget(absent)
+        self._names.make_absent_except(dids)
+
+    async def mark_absent_except(self, dids: Set[int]) -> None:
+        """
+            Marks absent every present user not listed in dids
+        """
+        await self.flush()
+        async with self.session() as session:
+            async with session.begin():
+                present = (await session.execute(q.select_present_user_dids())).scalars().all()
+                absent = [did for did in present if did not in dids]
+                for i in range(0, len(absent), self.SYNC_CHUNK_SIZE):
+                    chunk = absent[i:i + self.SYNC_CHUNK_SIZE]
+                    await session.execute(q.update_users_absent_by_dids(chunk))
+                    await session.execute(q.delete_user_roles_by_dids(chunk))
+        self._forget(absent)
+        self._names.make_absent_except(dids)
+
+    def merge_members_sync(self, members: List[discord.Member]) -> None:
+        rows = [conv.member_row(m, self.roles.role_rows_did_map) for m in members]
+        role_rows = [r for m in members for r in conv.user_role_rows(m)]
+        stmt = self._upsert_statement(DB.User, rows, 'did')
+        with self.sync_session() as session:
+            with session.begin():
+                if stmt is None:
+                    for row in rows:
+                        session.merge(model_type=DB.User, value=row, pk_col='did')
+                else:
+                    session.execute(stmt, rows)
+                session.execute(q.delete_user_roles_by_dids([m.id for m in members]))
+                if role_rows:
+                    session.execute(q.insert_user_roles(), role_rows)
+        self._forget(m.id for m in members)
+        for row in rows:
+            self._names.put_row(row)
+
+    async def merge_members(self, members: List[discord.Member]) -> None:
+        """
+            Upserts members (by did) and replaces their user_roles rows in single transaction
+        """
+        await self.flush()
+        rows = [conv.member_row(m, self.roles.role_rows_did_map) for m in members]
+        role_rows = [r for m in members for r in conv.user_role_rows(m)]
+        stmt = self._upsert_statement(DB.User, rows, 'did')
+        async with self.session() as session:
+            async with session.begin():
+                if stmt is None:
+                    for row in rows:
+                        await session.merge(model_type=DB.User, value=row, pk_col='did')
+                else:
+                    await session.execute(stmt, rows)
+                await session.execute(q.delete_user_roles_by_dids([m.id for m in members]))
+                if role_rows:
+                    await session.execute(q.insert_user_roles(), role_rows)
+        self._forget(m.id for m in members)
+        for row in rows:
+            self._names.put_row(row)
+
+    async def queue_member(self, d_user: discord.Member) -> None:
+        """
+            Deferred merge_members for single member (queued when write-behind is enabled)
+        """
+        if self._write_behind is None:
+            return await self.merge_members([d_user])
+        row = conv.member_row(d_user, self.roles.role_rows_did_map)
+        await self.upsert_deferred(DB.User, row, 'did')
+        self._cache_member_snapshot(d_user, row)
+        self._names.put_row(row)
+        await self.replace_deferred(DB.UserRole, d_user.id, conv.user_role_rows(d_user), 'user_did')
 
     def merge_member_sync(self, d_user: discord.Member) -> DB.User:
-        return self.merge_sync(DB.User, conv.member_row(d_user, self.roles.role_rows_did_map), 'did')
+        self.merge_members_sync([d_user])
+        return self.get_sync(d_user)
 
     async def merge_member(self, d_user: discord.Member) -> DB.User:
-        return await self.merge(DB.User, conv.member_row(d_user, self.roles.role_rows_did_map), 'did')
+        await self.merge_members([d_user])
+        return await self.get(d_user)
 
     def add_user_sync(self, d_user: discord.User) -> DB.User:
-        return self.create_sync(DB.User, conv.user_row(d_user))
+        row = conv.user_row(d_user)
+        user = self.create_sync(DB.User, row)
+        self._forget([d_user.id])
+        self._names.put_row(row)
+        return user
 
     async def add_user(self, d_user: discord.User) -> DB.User:
-        return await self.create(DB.User, conv.user_row(d_user))
+        row = conv.user_row(d_user)
+        user = await self.create(DB.User, row)
+        self._forget([d_user.id])
+        self._names.put_row(row)
+        return user
 
     def remove_sync(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
         user = self.get_sync(d_user)
-        return user and self.delete_sync(DB.User, user.id)
+        if user is None:
+            return None
+        user = self.delete_sync(DB.User, user.id)
+        self.execute_sync(q.delete_user_roles_by_dids([d_user.id]))
+        self._forget([d_user.id])
+        self._names.discard(d_user.id)
+        self._notify_removal()
+        return user
 
     async def remove(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
+        await self.flush()
         user = await self.get(d_user)
-        return user and await self.delete(DB.User, user.id)
+        if user is None:
+            return None
+        user = await self.delete(DB.User, user.id)
+        await self.execute(q.delete_user_roles_by_dids([d_user.id]))
+        self._forget([d_user.id])
+        self._names.discard(d_user.id)
+        self._notify_removal()
+        return user
 
     def make_user_absent_sync(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
-        self.execute_sync(q.update_user_absent_by_did(d_user.id))
+        self.execute_all_sync([q.update_user_absent_by_did(d_user.id), q.delete_user_roles_by_dids([d_user.id])])
+        self._forget([d_user.id])
+        self._names.make_absent(d_user.id)
         return self.get_sync(d_user)
 
     async def make_user_absent(self, d_user: Union[discord.User, discord.Member]) -> Optional[DB.User]:
-        await self.execute(q.update_user_absent_by_did(d_user.id))
+        await self.flush()
+        await self.execute_all([q.update_user_absent_by_did(d_user.id), q.delete_user_roles_by_dids([d_user.id])])
+        self._forget([d_user.id])
+        self._names.make_absent(d_user.id)
         return await self.get(d_user)
 
     def remove_absent_sync(self) -> None:
-        self.execute_sync(q.delete_absent_users())
+        self.execute_all_sync([q.delete_absent_user_roles(), q.delete_absent_users()])
+        self._forget_all()
+        self._names.discard_absent()
+        self._notify_removal()
 
     async def remove_absent(self) -> None:
-        await self.execute(q.delete_absent_users())
+        await self.flush()
+        await self.execute_all([q.delete_absent_user_roles(), q.delete_absent_users()])
+        self._forget_all()
+        self._names.discard_absent()
+        self._notify_removal()
 
     def clear_all_sync(self):
-        self.execute_sync(q.delete_all(DB.User))
+        self.execute_all_sync([q.delete_all(DB.UserRole), q.delete_all(DB.User)])
+        self._forget_all()
+        self._names.clear()
+        self._notify_removal()
 
     async def clear_all(self):
-        await self.execute(q.delete_all(DB.User))
+        await self.flush()
+        await self.execute_all([q.delete_all(DB.UserRole), q.delete_all(DB.User)])
+        self._forget_all()
+        self._names.clear()
+        self._notify_removal()
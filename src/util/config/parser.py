@@ -77,7 +77,7 @@ class TreeToDict(Transformer):
 
     @staticmethod
     def false(_) -> bool:
-        return True
+        return False
 
 
 class ConfigParser(object):
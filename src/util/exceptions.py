@@ -42,3 +42,13 @@ class NotCoroutineException(TypeError):
 class MissingResourceException(Exception):
     def __init__(self, xml: str, path: str):
         super().__init__(f'Missing resource in {xml}: {path}')
+
+
+class MojangAPIException(Exception):
+    def __init__(self, msg: str):
+        super().__init__(f'Mojang API error: {msg}')
+
+
+class SchemaVersionException(Exception):
+    def __init__(self, version: int, head: int):
+        super().__init__(f'Database schema version {version} is newer than supported {head}')
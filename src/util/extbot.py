@@ -31,6 +31,7 @@ __author__ = "Mathtin"
 import asyncio
 import os
 from datetime import datetime
+from functools import wraps
 from typing import Any, Callable, Dict, List, Awaitable, Optional, Union, Tuple
 
 import discord
@@ -65,14 +66,18 @@ def get_loop_attrs(obj: Any, filter_=lambda x: True, name_filter=lambda x: True)
 ######################
 
 def after_initialized(func):
+    @wraps(func)
     async def _func(self, *args, **kwargs):
-        await self.init_lock()
+        # Events arrived during startup are replayed once bot is initialized
+        if not self.initialized:
+            return self.defer_event(func, *args, **kwargs)
         return await func(self, *args, **kwargs)
 
     return _func
 
 
 def skip_bots(func):
+    @wraps(func)
     async def _func(self, obj, *args, **kwargs):
         if isinstance(obj, discord.User) or isinstance(obj, discord.Member):
             if obj.bot:
@@ -86,6 +91,7 @@ def skip_bots(func):
 
 
 def guild_member_event(func):
+    @wraps(func)
     async def _func(self, obj, *args, **kwargs):
         if isinstance(obj, discord.Member):
             if not self.is_guild_member(obj):
@@ -250,6 +256,7 @@ class ProgressEmbed(object):
     _current_step: int
     _name: str
     _state: int
+    _info: Optional[str]
 
     def __init__(self, name: str, base: discord.Embed) -> None:
         self._embed = base
@@ -259,6 +266,7 @@ class ProgressEmbed(object):
         self._steps = []
         self._current_step = 0
         self._state = ProgressEmbed.NOT_STARTED
+        self._info = None
 
     def _format_embed(self) -> None:
         self._embed.title = self._format_step(self._name, self._state)
@@ -266,6 +274,8 @@ class ProgressEmbed(object):
         elapsed = int((datetime.now() - self._date).total_seconds())
         self._embed.description += f'\n\n{R.NAME.COMMON.STATE}: **{self.state}**\n'
         self._embed.description += f'{R.MESSAGE.STATUS.ELAPSED}: {pretty_seconds(elapsed)}'
+        if self._info is not None:
+            self._embed.description += f'\n{self._info}'
 
     def _set_step_status(self, i: int, status: int):
         self._steps[i] = [(n, status) for n, _ in self._steps[i]]
@@ -278,6 +288,9 @@ class ProgressEmbed(object):
         if self._current_step < len(self._steps):
             self._set_step_status(self._current_step, ProgressEmbed.IN_PROGRESS)
 
+    def set_info(self, info: Optional[str]) -> None:
+        self._info = info
+
     def add_step(self, names: Union[str, List[str]]) -> None:
         if isinstance(names, str):
             return self.add_step([names])
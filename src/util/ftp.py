@@ -32,6 +32,9 @@ import io
 import os
 
 import ftplib
+from typing import Optional
+
+from util.uploader import IUploadConnection
 
 
 def server_exists(server_name: str):
@@ -54,3 +57,67 @@ def upload_file_content(content: bytes, dst_path: str, server_name: str):
         bio = io.BytesIO(content)
         ftp.storbinary(f"STOR {dst_path}", bio)
 
+
+class FTPConnection(IUploadConnection):
+    """
+        Persistent FTP connection (reconnects if server dropped it)
+    """
+
+    domain: str
+    port: int
+    username: str
+    password: str
+    timeout: float
+    _ftp: Optional[ftplib.FTP]
+
+    def __init__(self, domain: str, port: int, username: str, password: str, timeout: float = 30.0) -> None:
+        self.domain = domain
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._ftp = None
+
+    @staticmethod
+    def from_env(server_name: str, timeout: float = 30.0) -> 'FTPConnection':
+        if not server_exists(server_name):
+            raise EnvironmentError(f'Server {server_name} not found')
+        return FTPConnection(os.getenv(f'FTP_DOMAIN_{server_name}'),
+                             int(os.getenv(f'FTP_PORT_{server_name}')),
+                             os.getenv(f'FTP_USERNAME_{server_name}'),
+                             os.getenv(f'FTP_PASSWORD_{server_name}'),
+                             timeout=timeout)
+
+    def _connect(self) -> ftplib.FTP:
+        if self._ftp is not None:
+            try:
+                self._ftp.voidcmd('NOOP')
+                return self._ftp
+            except ftplib.all_errors:
+                self.close()
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.domain, self.port)
+        ftp.login(self.username, self.password)
+        self._ftp = ftp
+        return ftp
+
+    def upload(self, content: bytes, dst_path: str) -> None:
+        ftp = self._connect()
+        ftp.storbinary(f"STOR {dst_path}", io.BytesIO(content))
+
+    def close(self) -> None:
+        if self._ftp is None:
+            return
+        try:
+            self._ftp.quit()
+        except ftplib.all_errors:
+            self._ftp.close()
+        self._ftp = None
+
+    def abort(self) -> None:
+        ftp = self._ftp
+        if ftp is not None:
+            ftp.close()
+
+    def copy(self) -> 'FTPConnection':
+        return FTPConnection(self.domain, self.port, self.username, self.password, timeout=self.timeout)
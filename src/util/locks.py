@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+from collections import deque
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class _RWLockSide(object):
+    """
+        Async context manager acquiring one side (reader or writer) of RWLock
+    """
+
+    def __init__(self, lock: 'RWLock', writer: bool) -> None:
+        self._lock = lock
+        self._writer = writer
+
+    async def __aenter__(self) -> None:
+        if self._writer:
+            await self._lock.acquire_write()
+        else:
+            await self._lock.acquire_read()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._writer:
+            self._lock.release_write()
+        else:
+            self._lock.release_read()
+
+    def locked(self) -> bool:
+        return self._lock.write_locked if self._writer else self._lock.read_locked
+
+
+class RWLock(object):
+    """
+        Asyncio reader/writer lock
+
+        Any number of readers or single writer. Waiting writer blocks new readers,
+        so bulk operations are not starved by steady stream of events.
+    """
+
+    _readers: int
+    _writer: bool
+    _waiters: 'deque[Tuple[bool, asyncio.Future]]'
+
+    def __init__(self) -> None:
+        self._readers = 0
+        self._writer = False
+        self._waiters = deque()
+        self.reader = _RWLockSide(self, False)
+        self.writer = _RWLockSide(self, True)
+
+    @property
+    def read_locked(self) -> bool:
+        return self._readers > 0
+
+    @property
+    def write_locked(self) -> bool:
+        return self._writer
+
+    async def _wait(self, writer: bool) -> None:
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append((writer, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted right before cancellation, pass it on
+                if writer:
+                    self.release_write()
+                else:
+                    self.release_read()
+            else:
+                if (writer, future) in self._waiters:
+                    self._waiters.remove((writer, future))
+                self._wake()
+            raise
+
+    def _wake(self) -> None:
+        while self._waiters and not self._writer:
+            writer, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if writer:
+                if self._readers:
+                    return
+                self._waiters.popleft()
+                self._writer = True
+                future.set_result(None)
+                return
+            self._waiters.popleft()
+            self._readers += 1
+            future.set_result(None)
+
+    async def acquire_read(self) -> None:
+        if not self._writer and not self._waiters:
+            self._readers += 1
+            return
+        await self._wait(False)
+
+    def release_read(self) -> None:
+        self._readers -= 1
+        self._wake()
+
+    async def acquire_write(self) -> None:
+        if not self._writer and not self._readers and not self._waiters:
+            self._writer = True
+            return
+        await self._wait(True)
+
+    def release_write(self) -> None:
+        self._writer = False
+        self._wake()
+
+
+class KeyedLock(object):
+    """
+        Per-key asyncio locks, created on demand and dropped when unused
+    """
+
+    # key -> (lock, number of holders and waiters)
+    _locks: Dict[Hashable, List[Any]]
+
+    def __init__(self) -> None:
+        self._locks = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    async def acquire(self, key: Hashable) -> None:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._unref(key, entry)
+            raise
+
+    def release(self, key: Hashable) -> None:
+        entry = self._locks[key]
+        entry[0].release()
+        self._unref(key, entry)
+
+    def _unref(self, key: Hashable, entry: List[Any]) -> None:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+
+class _SharedContext(object):
+    """
+        Holds bulk lock as reader and given keys (acquired in sorted order to avoid deadlocks)
+    """
+
+    def __init__(self, manager: 'LockManager', keys: Tuple[Tuple[str, Any], ...]) -> None:
+        self._manager = manager
+        self._keys = sorted(set(keys), key=repr)
+        self._acquired = []
+
+    async def __aenter__(self) -> None:
+        await self._manager.bulk.acquire_read()
+        try:
+            for key in self._keys:
+                await self._manager.keys.acquire(key)
+                self._acquired.append(key)
+        except BaseException:
+            await self.__aexit__(None, None, None)
+            raise
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        while self._acquired:
+            self._manager.keys.release(self._acquired.pop())
+        self._manager.bulk.release_read()
+
+
+class LockManager(object):
+    """
+        Bot-wide locking
+
+        Events lock only entities they modify (user did, profile uuid, message id)
+        and proceed in parallel, bulk operations (full syncs, role changes)
+        take exclusive lock waiting for all of them.
+    """
+
+    USER = 'user'
+    PROFILE = 'profile'
+    MESSAGE = 'message'
+
+    bulk: RWLock
+    keys: KeyedLock
+
+    def __init__(self) -> None:
+        self.bulk = RWLock()
+        self.keys = KeyedLock()
+
+    def exclusive(self) -> _RWLockSide:
+        return self.bulk.writer
+
+    def shared(self, *keys: Tuple[str, Any]) -> _SharedContext:
+        return _SharedContext(self, keys)
+
+    def user(self, did: int) -> _SharedContext:
+        return self.shared((self.USER, did))
@@ -28,10 +28,21 @@ SOFTWARE.
 
 __author__ = "Mathtin"
 
+import asyncio
 import http.client
 import json
+from typing import Any, Dict, Iterable, List, Optional, Union
 from uuid import UUID
 
+import aiohttp
+
+from .exceptions import MojangAPIException
+
+MOJANG_API_URL = 'https://api.mojang.com'
+MOJANG_BULK_LIMIT = 10
+MOJANG_API_HEADERS = {'User-Agent': 'https://github.com/clerie/mcuuid',
+                      'Content-Type': 'application/json'}
+
 
 def is_valid_minecraft_username(username):
     """https://help.mojang.com/customer/portal/articles/928638-minecraft-usernames"""
@@ -67,7 +78,30 @@ def is_valid_mojang_uuid(uuid):
     return True
 
 
+def profile_request_path(identifier, timestamp=None) -> Optional[str]:
+    """
+        Build Mojang API request path for identifier (username or uuid)
+
+        Returns None if identifier is neither valid username nor valid uuid
+    """
+    # Handle the timestamp
+    get_args = ""
+    if timestamp is not None:
+        get_args = "?at=" + str(timestamp)
+
+    # Build the request path based on the identifier
+    if is_valid_minecraft_username(identifier):
+        return "/users/profiles/minecraft/" + identifier + get_args
+    elif is_valid_mojang_uuid(identifier):
+        return "/user/profiles/" + identifier + "/names" + get_args
+    return None
+
+
 class PlayerData:
+    valid: bool
+    username: str
+    uuid: UUID
+
     def __init__(self, identifier, timestamp=None):
         self.valid = True
         """
@@ -81,27 +115,15 @@ class PlayerData:
                 The time at which the player used this name, expressed as a Unix timestamp.
         """
 
-        # Handle the timestamp
-        get_args = ""
-        if timestamp is not None:
-            get_args = "?at=" + str(timestamp)
-
-        # Build the request path based on the identifier
-        req = ""
-        if is_valid_minecraft_username(identifier):
-            req = "/users/profiles/minecraft/" + identifier + get_args
-        elif is_valid_mojang_uuid(identifier):
-            req = "/user/profiles/" + identifier + "/names" + get_args
-        else:
+        req = profile_request_path(identifier, timestamp)
+        if req is None:
             self.valid = False
 
         # Proceed only, when the identifier was valid
         if self.valid:
             # Request the player data
             http_conn = http.client.HTTPSConnection("api.mojang.com")
-            http_conn.request("GET", req,
-                              headers={'User-Agent': 'https://github.com/clerie/mcuuid',
-                                       'Content-Type': 'application/json'})
+            http_conn.request("GET", req, headers=MOJANG_API_HEADERS)
             response = http_conn.getresponse().read().decode("utf-8")
 
             # In case the answer is empty, the user dont exist
@@ -109,38 +131,154 @@ class PlayerData:
                 self.valid = False
             # If there is an answer, fill out the variables
             else:
-                # Parse the JSON
-                json_data = json.loads(response)
-                uuid = None
-
-                ### Handle the response of the different requests on different ways
-                # Request using username
-                if is_valid_minecraft_username(identifier):
-                    # The UUID
-                    uuid = json_data['id']
-                    # The username written correctly
-                    self.username = json_data['name']
-                # Request using UUID
-                elif is_valid_mojang_uuid(identifier):
-                    # The UUID
-                    uuid = identifier
-
-                    current_name = ""
-                    current_time = 0
-
-                    # Getting the username based on timestamp
-                    for name in json_data:
-                        # Prepare the JSON
-                        # The first name has no change time
-                        if 'changedToAt' not in name:
-                            name['changedToAt'] = 0
-
-                        # Get the right name on timestamp
-                        if current_time <= name['changedToAt'] and (
-                                timestamp is None or name['changedToAt'] <= timestamp):
-                            current_time = name['changedToAt']
-                            current_name = name['name']
-
-                    # The username written correctly
-                    self.username = current_name
-                self.uuid = UUID(uuid)
+                self._load(identifier, json.loads(response), timestamp)
+
+    @classmethod
+    def from_response(cls, identifier, json_data: Any, timestamp=None) -> 'PlayerData':
+        """
+            Build player data from already fetched Mojang API response
+
+            None as json_data means the player does not exist
+        """
+        player = cls.__new__(cls)
+        player.valid = json_data is not None
+        if player.valid:
+            player._load(identifier, json_data, timestamp)
+        return player
+
+    @classmethod
+    def from_profile(cls, username: Optional[str], uuid: Optional[Union[UUID, str]]) -> 'PlayerData':
+        """
+            Build player data from known username and uuid
+
+            None as uuid means the player does not exist
+        """
+        player = cls.__new__(cls)
+        player.valid = uuid is not None
+        if player.valid:
+            player.username = username
+            player.uuid = uuid if isinstance(uuid, UUID) else UUID(uuid)
+        return player
+
+    def _load(self, identifier, json_data: Any, timestamp=None) -> None:
+        uuid = None
+
+        ### Handle the response of the different requests on different ways
+        # Request using username
+        if is_valid_minecraft_username(identifier):
+            # The UUID
+            uuid = json_data['id']
+            # The username written correctly
+            self.username = json_data['name']
+        # Request using UUID
+        elif is_valid_mojang_uuid(identifier):
+            # The UUID
+            uuid = identifier
+
+            current_name = ""
+            current_time = 0
+
+            # Getting the username based on timestamp
+            for name in json_data:
+                # Prepare the JSON
+                # The first name has no change time
+                if 'changedToAt' not in name:
+                    name['changedToAt'] = 0
+
+                # Get the right name on timestamp
+                if current_time <= name['changedToAt'] and (
+                        timestamp is None or name['changedToAt'] <= timestamp):
+                    current_time = name['changedToAt']
+                    current_name = name['name']
+
+            # The username written correctly
+            self.username = current_name
+        self.uuid = UUID(uuid)
+
+
+class MojangAPI(object):
+    """
+        Non-blocking Mojang API client
+
+        Keeps single aiohttp session (and its keep-alive connections) for all requests.
+        Session is created lazily inside running event loop.
+    """
+
+    _base_url: str
+    _timeout: aiohttp.ClientTimeout
+    _limit: int
+    _keepalive_timeout: float
+    _session: Optional[aiohttp.ClientSession]
+
+    def __init__(self, base_url: str = MOJANG_API_URL,
+                 timeout: float = 10.0,
+                 limit: int = 4,
+                 keepalive_timeout: float = 30.0) -> None:
+        self._base_url = base_url.rstrip('/')
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._limit = limit
+        self._keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._limit, keepalive_timeout=self._keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=self._timeout,
+                                                  headers=MOJANG_API_HEADERS)
+        return self._session
+
+    async def _request(self, method: str, path: str, payload: Any = None) -> Optional[Any]:
+        session = self._get_session()
+        try:
+            async with session.request(method, self._base_url + path, json=payload) as response:
+                # Unknown player
+                if response.status in (204, 404):
+                    return None
+                if response.status != 200:
+                    raise MojangAPIException(f'{method} {path} responded with {response.status}')
+                body = await response.read()
+        except asyncio.TimeoutError:
+            raise MojangAPIException(f'{method} {path} timed out')
+        except aiohttp.ClientError as e:
+            raise MojangAPIException(f'{method} {path} failed: {e}')
+        # In case the answer is empty, the user dont exist
+        if not body:
+            return None
+        return json.loads(body.decode('utf-8'))
+
+    async def player_data(self, identifier: str, timestamp=None) -> PlayerData:
+        req = profile_request_path(identifier, timestamp)
+        if req is None:
+            return PlayerData.from_response(identifier, None)
+        response = await self._request('GET', req)
+        return PlayerData.from_response(identifier, response, timestamp)
+
+    async def players_data(self, usernames: Iterable[str]) -> Dict[str, PlayerData]:
+        """
+            Resolve usernames via bulk profiles endpoint
+
+            Sends one request per MOJANG_BULK_LIMIT names.
+            Returns player data (invalid for unknown players) keyed by lower-cased username
+        """
+        res = {}
+        names = []
+        for username in usernames:
+            key = username.lower()
+            if key in res:
+                continue
+            # Unknown until found in response
+            res[key] = PlayerData.from_profile(None, None)
+            if is_valid_minecraft_username(username):
+                names.append(username)
+        chunks = [names[i:i + MOJANG_BULK_LIMIT] for i in range(0, len(names), MOJANG_BULK_LIMIT)]
+        for chunk in chunks:
+            response = await self._request('POST', '/profiles/minecraft', chunk)
+            for profile in response or []:
+                res[profile['name'].lower()] = PlayerData.from_response(profile['name'], profile)
+        return res
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
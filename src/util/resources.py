@@ -94,13 +94,149 @@ class XStrings(object):
             def PROGRESS(self) -> str:
                 return self.get("progress")
         
+            @property
+            def IGN_CACHE(self) -> str:
+                return self.get("ign-cache")
+        
+            @property
+            def SYNC_POOL(self) -> str:
+                return self.get("sync-pool")
+        
+            @property
+            def ASYNC_POOL(self) -> str:
+                return self.get("async-pool")
+        
+            @property
+            def DB_EXECUTOR(self) -> str:
+                return self.get("db-executor")
+        
+            @property
+            def NO_HANDLERS(self) -> str:
+                return self.get("no-handlers")
+        
+    
+        class XStat(object):
+            _type_name = "stat"
+        
+            def __init__(self, section) -> None:
+                self._section = section
+        
+            def get(self, string_name) -> str:
+                return self._section.get(self._type_name, string_name)
+        
+            @property
+            def ENTRIES(self) -> str:
+                return self.get("entries")
+        
+            @property
+            def MEMORY_HITS(self) -> str:
+                return self.get("memory-hits")
+        
+            @property
+            def DB_HITS(self) -> str:
+                return self.get("db-hits")
+        
+            @property
+            def MISSES(self) -> str:
+                return self.get("misses")
+        
+            @property
+            def CHECKED_OUT(self) -> str:
+                return self.get("checked-out")
+        
+            @property
+            def OVERFLOW(self) -> str:
+                return self.get("overflow")
+        
+            @property
+            def CHECKOUTS(self) -> str:
+                return self.get("checkouts")
+        
+            @property
+            def TIMEOUTS(self) -> str:
+                return self.get("timeouts")
+        
+            @property
+            def WAIT(self) -> str:
+                return self.get("wait")
+        
+            @property
+            def MS_AVG(self) -> str:
+                return self.get("ms-avg")
+        
+            @property
+            def MS_MAX(self) -> str:
+                return self.get("ms-max")
+        
+            @property
+            def WORKERS(self) -> str:
+                return self.get("workers")
+        
+            @property
+            def QUEUED(self) -> str:
+                return self.get("queued")
+        
+            @property
+            def HANDLERS(self) -> str:
+                return self.get("handlers")
+        
+            @property
+            def BUCKETS(self) -> str:
+                return self.get("buckets")
+        
+            @property
+            def CALLS(self) -> str:
+                return self.get("calls")
+        
+            @property
+            def DEPTH(self) -> str:
+                return self.get("depth")
+        
+            @property
+            def MAX(self) -> str:
+                return self.get("max")
+        
+            @property
+            def ACTIVE(self) -> str:
+                return self.get("active")
+        
+            @property
+            def RUNNING(self) -> str:
+                return self.get("running")
+        
+            @property
+            def PROCESSED(self) -> str:
+                return self.get("processed")
+        
+            @property
+            def DROPPED(self) -> str:
+                return self.get("dropped")
+        
+            @property
+            def COALESCED(self) -> str:
+                return self.get("coalesced")
+        
+            @property
+            def ROUTED_TO(self) -> str:
+                return self.get("routed-to")
+        
+            @property
+            def CHANNELS(self) -> str:
+                return self.get("channels")
+        
+            @property
+            def SKIPPED(self) -> str:
+                return self.get("skipped")
+        
     
         _section_name = "names"
         COMMON: XCommon
+        STAT: XStat
     
         def __init__(self, res) -> None:
             self._res = res
             self.COMMON = XStrings.XName.XCommon(self)
+            self.STAT = XStrings.XName.XStat(self)
     
         def get(self, type_name, string_name) -> str:
             return self._res.get(self._section_name, type_name, string_name)
@@ -211,6 +347,14 @@ class XStrings(object):
             def EXTENSION_STATUS_LIST(self) -> str:
                 return self.get("extension-status-list")
         
+            @property
+            def DB_STATUS(self) -> str:
+                return self.get("db-status")
+        
+            @property
+            def DISPATCH_STATS(self) -> str:
+                return self.get("dispatch-stats")
+        
     
         _section_name = "embeds"
         HEADER: XHeader
@@ -248,10 +392,6 @@ class XStrings(object):
             def PING(self) -> str:
                 return self.get("ping")
         
-            @property
-            def REMOVING_DYNAMIC_PROFILES(self) -> str:
-                return self.get("removing-dynamic-profiles")
-        
             @property
             def LOADING_DYNAMIC_PROFILES(self) -> str:
                 return self.get("loading-dynamic-profiles")
@@ -300,6 +440,10 @@ class XStrings(object):
             def ELAPSED(self) -> str:
                 return self.get("elapsed")
         
+            @property
+            def PROCESSED_MESSAGES(self) -> str:
+                return self.get("processed-messages")
+        
     
         class XState(object):
             _type_name = "state"
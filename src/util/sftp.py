@@ -30,8 +30,13 @@ __author__ = "Mathtin"
 
 import io
 import os
+import socket
 
+import paramiko
 import pysftp
+from typing import Optional
+
+from util.uploader import IUploadConnection
 
 
 def server_exists(server_name: str):
@@ -54,3 +59,81 @@ def upload_file_content(content: bytes, dst_path: str, server_name: str):
     with pysftp.Connection(domain, username=username, password=password, cnopts=cnopts, port=port) as sftp:
         sftp.putfo(bio, dst_path)
 
+
+class SFTPConnection(IUploadConnection):
+    """
+        Persistent SFTP connection (reconnects if transport is closed)
+
+        Built on paramiko directly, so connect, handshake, auth and channel
+        operations are all bounded by timeout (host keys are not checked, same as before)
+    """
+
+    domain: str
+    port: int
+    username: str
+    password: str
+    timeout: float
+    _transport: Optional[paramiko.Transport]
+    _sftp: Optional[paramiko.SFTPClient]
+
+    def __init__(self, domain: str, port: int, username: str, password: str, timeout: float = 30.0) -> None:
+        self.domain = domain
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._transport = None
+        self._sftp = None
+
+    @staticmethod
+    def from_env(server_name: str, timeout: float = 30.0) -> 'SFTPConnection':
+        if not server_exists(server_name):
+            raise EnvironmentError(f'Server {server_name} not found')
+        return SFTPConnection(os.getenv(f'SFTP_DOMAIN_{server_name}'),
+                              int(os.getenv(f'SFTP_PORT_{server_name}')),
+                              os.getenv(f'SFTP_USERNAME_{server_name}'),
+                              os.getenv(f'SFTP_PASSWORD_{server_name}'),
+                              timeout=timeout)
+
+    def _connect(self) -> paramiko.SFTPClient:
+        if self._sftp is not None:
+            if self._transport is not None and self._transport.is_active():
+                return self._sftp
+            self.close()
+        sock = socket.create_connection((self.domain, self.port), timeout=self.timeout)
+        transport = paramiko.Transport(sock)
+        transport.banner_timeout = self.timeout
+        transport.handshake_timeout = self.timeout
+        transport.auth_timeout = self.timeout
+        try:
+            transport.connect(username=self.username, password=self.password)
+            sftp = paramiko.SFTPClient.from_transport(transport)
+            sftp.get_channel().settimeout(self.timeout)
+        except Exception:
+            transport.close()
+            raise
+        self._transport = transport
+        self._sftp = sftp
+        return sftp
+
+    def upload(self, content: bytes, dst_path: str) -> None:
+        sftp = self._connect()
+        sftp.putfo(io.BytesIO(content), dst_path)
+
+    def close(self) -> None:
+        if self._transport is None:
+            return
+        try:
+            self._sftp.close()
+            self._transport.close()
+        finally:
+            self._sftp = None
+            self._transport = None
+
+    def abort(self) -> None:
+        transport = self._transport
+        if transport is not None:
+            transport.close()
+
+    def copy(self) -> 'SFTPConnection':
+        return SFTPConnection(self.domain, self.port, self.username, self.password, timeout=self.timeout)
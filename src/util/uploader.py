@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+
+import asyncio
+import hashlib
+import logging
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+log = logging.getLogger('uploader')
+
+
+class IUploadConnection(object):
+    """
+        Reusable (authenticated) connection to file server
+
+        Implementations are used from single worker thread
+    """
+
+    def upload(self, content: bytes, dst_path: str) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        raise NotImplementedError()
+
+    def abort(self) -> None:
+        """
+            Drops connection without goodbye, safe to call from another thread
+
+            Unblocks operation hung in worker thread
+        """
+        raise NotImplementedError()
+
+    def copy(self) -> 'IUploadConnection':
+        """
+            Returns new (not connected) connection with the same settings
+        """
+        raise NotImplementedError()
+
+
+class ServerUploader(object):
+    """
+        Uploads files to single server off the event loop
+
+        Keeps connection alive between uploads, each upload is bounded with timeout
+        and retried on failure (with fresh connection). Timed out connection and its
+        worker thread are abandoned, so retry never queues behind hung call.
+        Remembers digest of last uploaded content per path and skips uploads of unchanged content
+    """
+
+    name: str
+    timeout: float
+    retries: int
+    retry_delay: float
+    _connection: IUploadConnection
+    _executor: Optional[ThreadPoolExecutor]
+    _digests: Dict[str, str]
+
+    def __init__(self, name: str, connection: IUploadConnection,
+                 timeout: float = 30.0,
+                 retries: int = 2,
+                 retry_delay: float = 1.0) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._connection = connection
+        self._executor = None
+        self._digests = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'UPLOADER_{self.name}_')
+        return self._executor
+
+    def _upload_sync(self, connection: IUploadConnection, content: bytes, dst_path: str) -> None:
+        try:
+            connection.upload(content, dst_path)
+        except Exception:
+            self._close_sync(connection)
+            raise
+
+    def _close_sync(self, connection: IUploadConnection) -> None:
+        try:
+            connection.close()
+        except Exception as e:
+            log.debug(f'Failed to close connection to {self.name}: {e}')
+
+    def _reset(self) -> None:
+        """
+            Abandons hung connection with its worker thread, next attempt starts clean
+        """
+        connection = self._connection
+        try:
+            connection.abort()
+        except Exception as e:
+            log.debug(f'Failed to abort connection to {self.name}: {e}')
+        self._connection = connection.copy()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def upload(self, content: bytes, dst_path: str, force: bool = False) -> bool:
+        """
+            Uploads content unless it is the same as last uploaded one
+
+            Returns True if content was uploaded
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        if not force and self._digests.get(dst_path) == digest:
+            return False
+        # Remote state is unknown until upload succeeds
+        self._digests.pop(dst_path, None)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            try:
+                future = loop.run_in_executor(self._get_executor(), self._upload_sync,
+                                              self._connection, content, dst_path)
+                await asyncio.wait_for(future, self.timeout)
+                self._digests[dst_path] = digest
+                return True
+            except Exception as e:
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                if timed_out:
+                    self._reset()
+                reason = 'timed out' if timed_out else str(e)
+                log.warning(f'Failed to upload {dst_path} to {self.name} '
+                            f'(attempt {attempt + 1}/{self.retries + 1}): {reason}')
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.retry_delay * (attempt + 1))
+
+    def close(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.submit(self._close_sync, self._connection)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+class UploadPool(object):
+    """
+        Uploads files to several servers concurrently
+    """
+
+    _uploaders: Dict[str, ServerUploader]
+
+    def __init__(self, uploaders: List[ServerUploader]) -> None:
+        self._uploaders = {u.name: u for u in uploaders}
+
+    @property
+    def servers(self) -> List[str]:
+        return list(self._uploaders.keys())
+
+    async def upload(self, content: bytes, dst_path: str, force: bool = False) -> Dict[str, Union[bool, BaseException]]:
+        """
+            Uploads content to each server
+
+            Returns map of server name to upload result (False if skipped) or exception
+        """
+        names = list(self._uploaders.keys())
+        results = await asyncio.gather(*[self._uploaders[n].upload(content, dst_path, force) for n in names],
+                                       return_exceptions=True)
+        return dict(zip(names, results))
+
+    def close(self) -> None:
+        for uploader in self._uploaders.values():
+            uploader.close()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+import uuid
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from services.mojang import MojangService
+from util.exceptions import MojangAPIException
+from util.mcuuid import MojangAPI, MOJANG_BULK_LIMIT
+
+PLAYERS = {f'player{i}': uuid.UUID(int=i + 1) for i in range(25)}
+
+
+class MojangStub(object):
+    """
+        Local Mojang API stub, counts served requests
+    """
+
+    def __init__(self) -> None:
+        self.gets = []
+        self.posts = []
+        self.status = 200
+        self.delay = 0.0
+        app = web.Application()
+        app.router.add_get('/users/profiles/minecraft/{name}', self.profile)
+        app.router.add_post('/profiles/minecraft', self.profiles)
+        self.server = TestServer(app)
+
+    @staticmethod
+    def _profile(name: str):
+        return {'id': PLAYERS[name].hex, 'name': name.capitalize()}
+
+    async def _respond(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return None
+
+    async def profile(self, request: web.Request) -> web.Response:
+        name = request.match_info['name'].lower()
+        self.gets.append(name)
+        response = await self._respond()
+        if response is not None:
+            return response
+        if name not in PLAYERS:
+            return web.Response(status=204)
+        return web.json_response(self._profile(name))
+
+    async def profiles(self, request: web.Request) -> web.Response:
+        names = [n.lower() for n in await request.json()]
+        self.posts.append(names)
+        response = await self._respond()
+        if response is not None:
+            return response
+        return web.json_response([self._profile(n) for n in names if n in PLAYERS])
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url(''))
+
+    async def __aenter__(self) -> 'MojangStub':
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.server.close()
+
+
+#############
+# MojangAPI #
+#############
+
+async def test_player_data():
+    async with MojangStub() as stub:
+        api = MojangAPI(base_url=stub.url)
+        try:
+            player = await api.player_data('Player1')
+            assert player.valid
+            assert player.username == 'Player1'
+            assert player.uuid == PLAYERS['player1']
+            assert not (await api.player_data('unknown_guy')).valid
+            # Invalid identifier is not requested at all
+            assert not (await api.player_data('no spaces allowed')).valid
+            assert stub.gets == ['player1', 'unknown_guy']
+        finally:
+            await api.close()
+
+
+async def test_players_data_chunks():
+    names = [f'player{i}' for i in range(23)] + ['unknown_guy', 'Player0']
+    async with MojangStub() as stub:
+        api = MojangAPI(base_url=stub.url)
+        try:
+            res = await api.players_data(names)
+        finally:
+            await api.close()
+    assert [len(chunk) for chunk in stub.posts] == [MOJANG_BULK_LIMIT, MOJANG_BULK_LIMIT, 4]
+    assert res['player0'].uuid == PLAYERS['player0']
+    assert res['player22'].username == 'Player22'
+    assert not res['unknown_guy'].valid
+
+
+@pytest.mark.parametrize('status, delay', [(500, 0.0), (200, 1.0)])
+async def test_request_failures(status, delay):
+    async with MojangStub() as stub:
+        stub.status = status
+        stub.delay = delay
+        api = MojangAPI(base_url=stub.url, timeout=0.2)
+        try:
+            with pytest.raises(MojangAPIException):
+                await api.player_data('player1')
+            with pytest.raises(MojangAPIException):
+                await api.players_data(['player1'])
+        finally:
+            await api.close()
+
+
+#################
+# MojangService #
+#################
+
+async def test_resolve_caches(db):
+    async with MojangStub() as stub:
+        service = MojangService(db, MojangAPI(base_url=stub.url))
+        try:
+            assert (await service.resolve('Player1')).uuid == PLAYERS['player1']
+            assert (await service.resolve('player1')).uuid == PLAYERS['player1']
+            assert not (await service.resolve('unknown_guy')).valid
+            assert not (await service.resolve('unknown_guy')).valid
+            assert stub.gets == ['player1', 'unknown_guy']
+            assert service.stats()['memory_hits'] == 2
+        finally:
+            await service.close()
+        # Fresh service is served by database cache
+        service = MojangService(db, MojangAPI(base_url=stub.url))
+        try:
+            assert (await service.resolve('player1')).username == 'Player1'
+            assert not (await service.resolve('unknown_guy')).valid
+            assert stub.gets == ['player1', 'unknown_guy']
+            assert service.stats()['db_hits'] == 2
+        finally:
+            await service.close()
+
+
+async def test_resolve_many(db):
+    async with MojangStub() as stub:
+        service = MojangService(db, MojangAPI(base_url=stub.url))
+        try:
+            await service.resolve('player1')
+            res = await service.resolve_many(['Player1', 'player2', 'player3', 'unknown_guy', 'bad name'])
+            assert sorted(stub.posts[0]) == ['player2', 'player3', 'unknown_guy']
+            assert res['player1'].uuid == PLAYERS['player1']
+            assert res['player3'].uuid == PLAYERS['player3']
+            assert not res['unknown_guy'].valid
+            assert 'bad name' not in res
+            # Everything is cached now
+            await service.resolve_many(['player2', 'unknown_guy'])
+            assert len(stub.posts) == 1
+        finally:
+            await service.close()
+        service = MojangService(db, MojangAPI(base_url=stub.url))
+        try:
+            res = await service.resolve_many(['player2', 'player3', 'player4'])
+            assert stub.posts[1] == ['player4']
+            assert res['player2'].username == 'Player2'
+            assert service.db_hits == 2
+        finally:
+            await service.close()
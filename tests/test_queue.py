@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from overlord.queue import ExtensionQueue
+from overlord.types import OverlordMember
+
+
+async def test_coalesce_replaces_pending_call_for_same_event():
+    queue = ExtensionQueue('test', max_size=2, overflow=ExtensionQueue.COALESCE)
+    gate = asyncio.Event()
+    calls = []
+
+    async def handler(payload):
+        await gate.wait()
+        calls.append(payload)
+
+    first, second, update = [SimpleNamespace(message_id=i, v=v) for i, v in [(1, 0), (2, 0), (2, 1)]]
+    assert await queue.put('on_raw', handler, first)
+    await asyncio.sleep(0)  # worker takes first call
+    assert await queue.put('on_raw', handler, second)
+    assert await queue.put('on_raw', handler, SimpleNamespace(message_id=3, v=0))
+    # Same handler and message as pending call, replaced without waiting
+    assert await asyncio.wait_for(queue.put('on_raw', handler, update), 0.1)
+    assert queue.stats()['coalesced'] == 1
+    gate.set()
+    queue.close()
+    await asyncio.wait_for(asyncio.gather(*queue._workers), 1)
+    # Replaced call keeps its place in queue
+    assert [(c.message_id, c.v) for c in calls] == [(1, 0), (2, 1), (3, 0)]
+
+
+async def test_coalesce_blocks_without_matching_event():
+    queue = ExtensionQueue('test', max_size=1, overflow=ExtensionQueue.COALESCE)
+    gate = asyncio.Event()
+    calls = []
+
+    async def handler(payload):
+        await gate.wait()
+        calls.append(payload.message_id)
+
+    await queue.put('on_raw', handler, SimpleNamespace(message_id=1))
+    await asyncio.sleep(0)
+    await queue.put('on_raw', handler, SimpleNamespace(message_id=2))
+    put = asyncio.ensure_future(queue.put('on_raw', handler, SimpleNamespace(message_id=3)))
+    await asyncio.sleep(0.05)
+    # Unrelated event is kept, caller waits for free slot
+    assert not put.done()
+    gate.set()
+    assert await asyncio.wait_for(put, 1)
+    queue.close()
+    await asyncio.wait_for(asyncio.gather(*queue._workers), 1)
+    assert calls == [1, 2, 3]
+    assert queue.stats()['coalesced'] == 0
+
+
+def member(did, state):
+    # OverlordMember wraps discord member, its id is not exposed directly
+    d_member = discord.Member.__new__(discord.Member)
+    d_member._user = SimpleNamespace(id=did)
+    return OverlordMember(d_member, state)
+
+
+async def test_coalesce_merges_member_updates():
+    queue = ExtensionQueue('test', max_size=2, overflow=ExtensionQueue.COALESCE)
+    gate = asyncio.Event()
+    calls = []
+
+    async def handler(*args):
+        await gate.wait()
+        calls.append(tuple((m.discord.id, m.db) for m in args))
+
+    await queue.put('on_member_join', handler, member(1, 'joined'))
+    await asyncio.sleep(0)
+    await queue.put('on_member_update', handler, member(2, 'a'), member(2, 'b'))
+    await queue.put('on_member_update', handler, member(3, 'a'), member(3, 'b'))
+    assert await asyncio.wait_for(queue.put('on_member_update', handler, member(2, 'b'), member(2, 'c')), 0.1)
+    assert queue.stats()['coalesced'] == 1
+    gate.set()
+    queue.close()
+    await asyncio.wait_for(asyncio.gather(*queue._workers), 1)
+    # Earliest 'before' and latest 'after' of member 2
+    assert calls == [((1, 'joined'),), ((2, 'a'), (2, 'c')), ((3, 'a'), (3, 'b'))]
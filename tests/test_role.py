@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+import db as DB
+from services.role import RoleService
+
+
+def d_role(did: int, name: str) -> SimpleNamespace:
+    return SimpleNamespace(id=did, name=name, created_at=datetime.datetime(2021, 1, 1))
+
+
+def role_slots(db):
+    with db.sync_session() as session:
+        return dict(session.execute(select(DB.Role.did, DB.Role.idx)).all())
+
+
+async def test_restart_after_runtime_role_changes(db):
+    a, b, c, d = d_role(10, 'a'), d_role(20, 'b'), d_role(30, 'c'), d_role(40, 'd')
+    service = RoleService(db)
+    await service.load([a, b, c])
+    assert role_slots(db) == {10: 0, 20: 1, 30: 2}
+    # Runtime changes reuse lowest free slot
+    await service.remove_role(b)
+    await service.add_role(d)
+    assert role_slots(db) == {10: 0, 30: 2, 40: 1}
+    # Startup sync recompacts slots (swaps 30 and 40 unique idx)
+    service = RoleService(db)
+    await service.load([a, c, d])
+    assert role_slots(db) == {10: 0, 30: 1, 40: 2}
+    assert service.decode_mask(service.encode_mask([c, d])) == [30, 40]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import threading
+
+import pytest
+from sqlalchemy import select
+
+import db as DB
+from db.session import DBExecutor
+
+
+def role_rows(*roles):
+    return [{'did': did, 'name': name, 'idx': idx} for did, name, idx in roles]
+
+
+def table_state(db):
+    with db.sync_session() as session:
+        rows = session.execute(select(DB.Role.did, DB.Role.name, DB.Role.idx).order_by(DB.Role.idx)).all()
+    return [tuple(row) for row in rows]
+
+
+def sync_roles(db, rows):
+    with db.sync_session() as session:
+        with session.begin():
+            session.sync_table(DB.Role, rows, pk_col='did')
+
+
+TRANSITIONS = [
+    # New role in the middle shifts unique idx up
+    ([(10, 'a', 0), (20, 'b', 1), (30, 'c', 2)],
+     [(10, 'a', 0), (15, 'n', 1), (20, 'b', 2), (30, 'c', 3)]),
+    # Removed role shifts unique idx down
+    ([(10, 'a', 0), (20, 'b', 1), (30, 'c', 2)],
+     [(10, 'a', 0), (30, 'c', 1)]),
+    # Swapped unique names and idx
+    ([(10, 'a', 0), (20, 'b', 1)],
+     [(10, 'b', 1), (20, 'a', 0)]),
+    # Deleted role releases its values for new one
+    ([(10, 'a', 0), (20, 'b', 1)],
+     [(20, 'a', 0), (30, 'b', 1)]),
+]
+
+
+@pytest.mark.parametrize('before, after', TRANSITIONS)
+def test_sync_table_moves_unique_values(db, before, after):
+    sync_roles(db, role_rows(*before))
+    assert table_state(db) == sorted(before, key=lambda r: r[2])
+    sync_roles(db, role_rows(*after))
+    assert table_state(db) == sorted(after, key=lambda r: r[2])
+
+
+@pytest.mark.parametrize('before, after', TRANSITIONS)
+async def test_async_sync_table_moves_unique_values(db, before, after):
+    for rows in (before, after):
+        async with db.async_session() as session:
+            async with session.begin():
+                await session.sync_table(DB.Role, role_rows(*rows), pk_col='did')
+    assert table_state(db) == sorted(after, key=lambda r: r[2])
+
+
+def test_executor_counts_queued_calls():
+    executor = DBExecutor(max_workers=1)
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    waiting = [executor.submit(lambda: None) for _ in range(2)]
+    assert executor.queued >= 2
+    release.set()
+    for future in [running, *waiting]:
+        future.result(timeout=1)
+    assert executor.queued == 0
+    executor.shutdown()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+from collections import deque
+
+from overlord.bot import Overlord
+
+
+def startup_bot() -> Overlord:
+    bot = Overlord.__new__(Overlord)
+    bot._initialized = False
+    bot._init_event = asyncio.Event()
+    bot._startup_events = deque()
+    bot.scheduled = []
+    bot._schedule_event = lambda coro, name, *args, **kwargs: bot.scheduled.append(name)
+    return bot
+
+
+def test_decorated_handlers_keep_event_names():
+    assert Overlord.on_message.__name__ == 'on_message'
+    assert Overlord.on_member_join.__name__ == 'on_member_join'
+    assert Overlord.on_raw_message_edit.__name__ == 'on_raw_message_edit'
+
+
+async def test_startup_events_replayed_under_event_name():
+    bot = startup_bot()
+    await bot.on_member_join(object())
+    await bot.on_raw_message_edit(object())
+    assert [handler.__name__ for handler, _, _ in bot._startup_events] == ['on_member_join', 'on_raw_message_edit']
+    bot._mark_initialized()
+    assert bot.scheduled == ['on_member_join', 'on_raw_message_edit']
+    assert not bot._startup_events
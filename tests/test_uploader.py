@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from util.sftp import SFTPConnection
+from util.uploader import IUploadConnection, ServerUploader, UploadPool
+
+
+class FakeConnection(IUploadConnection):
+    """
+        Scripted connection: each upload pops next behaviour ('ok', 'fail' or 'hang')
+    """
+
+    def __init__(self, script, log=None) -> None:
+        self.script = script
+        self.log = log if log is not None else []
+        self.uploads = []
+        self.closed = 0
+        self.aborted = threading.Event()
+
+    def upload(self, content: bytes, dst_path: str) -> None:
+        action = self.script.pop(0) if self.script else 'ok'
+        self.log.append((id(self), action))
+        if action == 'fail':
+            raise IOError('connection reset')
+        if action == 'hang':
+            # Blocks like stuck socket until connection is aborted
+            if not self.aborted.wait(5):
+                raise AssertionError('hung upload was never aborted')
+            raise IOError('connection aborted')
+        self.uploads.append((content, dst_path))
+
+    def close(self) -> None:
+        self.closed += 1
+
+    def abort(self) -> None:
+        self.aborted.set()
+
+    def copy(self) -> 'FakeConnection':
+        copy = FakeConnection(self.script, self.log)
+        self.copies = getattr(self, 'copies', []) + [copy]
+        return copy
+
+
+async def test_upload_skips_unchanged_content():
+    connection = FakeConnection([])
+    uploader = ServerUploader('main', connection, timeout=1, retry_delay=0)
+    try:
+        assert await uploader.upload(b'[]', 'whitelist.json')
+        assert not await uploader.upload(b'[]', 'whitelist.json')
+        assert await uploader.upload(b'[]', 'whitelist.json', force=True)
+        assert await uploader.upload(b'[1]', 'whitelist.json')
+        assert len(connection.uploads) == 3
+    finally:
+        uploader.close()
+
+
+async def test_upload_retries_failure():
+    connection = FakeConnection(['fail', 'ok'])
+    uploader = ServerUploader('main', connection, timeout=1, retries=2, retry_delay=0)
+    try:
+        assert await uploader.upload(b'[]', 'whitelist.json')
+        # Failed connection is closed and reused (reconnect is up to connection)
+        assert connection.closed == 1
+        assert connection.uploads == [(b'[]', 'whitelist.json')]
+    finally:
+        uploader.close()
+
+
+async def test_upload_timeout_starts_clean():
+    connection = FakeConnection(['hang', 'ok'])
+    uploader = ServerUploader('main', connection, timeout=0.2, retries=1, retry_delay=0)
+    try:
+        started_at = time.monotonic()
+        assert await uploader.upload(b'[]', 'whitelist.json')
+        # Retry did not wait for hung call
+        assert time.monotonic() - started_at < 1.0
+        assert connection.aborted.is_set()
+        fresh = connection.copies[0]
+        assert fresh.uploads == [(b'[]', 'whitelist.json')]
+        assert [action for _, action in connection.log] == ['hang', 'ok']
+        assert connection.log[0][0] != connection.log[1][0]
+    finally:
+        uploader.close()
+
+
+async def test_upload_gives_up():
+    connection = FakeConnection(['fail', 'hang', 'fail'])
+    uploader = ServerUploader('main', connection, timeout=0.2, retries=2, retry_delay=0)
+    try:
+        with pytest.raises(IOError):
+            await uploader.upload(b'[]', 'whitelist.json')
+        # Nothing is remembered as uploaded
+        connection.script[:] = []
+        assert await uploader.upload(b'[]', 'whitelist.json')
+    finally:
+        uploader.close()
+
+
+async def test_pool_isolates_failures():
+    pool = UploadPool([ServerUploader('ok', FakeConnection([]), timeout=1, retry_delay=0),
+                       ServerUploader('bad', FakeConnection(['fail'] * 3), timeout=1, retries=2, retry_delay=0),
+                       ServerUploader('slow', FakeConnection(['hang']), timeout=0.2, retries=0, retry_delay=0)])
+    try:
+        results = await pool.upload(b'[]', 'whitelist.json')
+        assert results['ok'] is True
+        assert isinstance(results['bad'], IOError)
+        assert isinstance(results['slow'], asyncio.TimeoutError)
+    finally:
+        pool.close()
+
+
+def test_sftp_connect_timeout():
+    # Server accepts connection but never sends ssh banner
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    try:
+        connection = SFTPConnection('127.0.0.1', server.getsockname()[1], 'user', 'password', timeout=0.3)
+        started_at = time.monotonic()
+        with pytest.raises(Exception):
+            connection.upload(b'[]', 'whitelist.json')
+        assert time.monotonic() - started_at < 3.0
+    finally:
+        server.close()
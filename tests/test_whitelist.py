@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+from types import SimpleNamespace
+
+from extensions.whitelist import WhitelistExtension
+from util.locks import LockManager
+
+
+class FakeProfiles(object):
+
+    def __init__(self, *profiles) -> None:
+        self.profiles = list(profiles)
+        self.removed = []
+
+    async def get_by_ign(self, ign):
+        return next((p for p in self.profiles if p.ign == ign), None)
+
+    async def get_by_message_did(self, did):
+        return next((p for p in self.profiles if p.message_did == did), None)
+
+    async def remove(self, profile) -> None:
+        self.profiles.remove(profile)
+        self.removed.append(profile)
+
+    async def save(self, profile) -> None:
+        pass
+
+    async def get_whitelist_content(self) -> bytes:
+        return b'[]'
+
+
+class FakeUploader(object):
+
+    def __init__(self) -> None:
+        self.uploads = []
+        self.closed = False
+
+    async def upload(self, content: bytes, dst_path: str, force: bool = False):
+        assert not self.closed
+        self.uploads.append((content, dst_path))
+        return {'main': True}
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def whitelist(profiles: FakeProfiles) -> WhitelistExtension:
+    services = SimpleNamespace(user=None, role=None, mojang=None, player_profiles=profiles)
+    bot = SimpleNamespace(locks=LockManager(), services=services, initialized=True, loop=asyncio.get_running_loop())
+    ext = WhitelistExtension(bot)
+    ext._enabled = True
+    ext.channel = SimpleNamespace(id=1)
+    ext.config = SimpleNamespace(sync_delay=60.0)
+    ext._dry_sync = ext._dry_run = False
+    ext._uploader = FakeUploader()
+    return ext
+
+
+async def test_delete_of_replaced_message_keeps_updated_profile():
+    profile = SimpleNamespace(uuid='uuid', user=SimpleNamespace(did=5), message_did=100, persistent=False)
+    profiles = FakeProfiles(profile)
+    ext = whitelist(profiles)
+    # Profile update (on_message) holds owner and profile keys while old message is deleted
+    async with ext.bot.locks.shared((LockManager.USER, 5), (LockManager.PROFILE, 'uuid')):
+        delete = asyncio.ensure_future(ext.on_message_delete(SimpleNamespace(channel_id=1, message_id=100)))
+        await asyncio.sleep(0.01)
+        profile.message_did = 200
+    await delete
+    assert profiles.removed == []
+    # Deleting current message still removes profile
+    await ext.on_message_delete(SimpleNamespace(channel_id=1, message_id=200))
+    assert profiles.removed == [profile]
+
+
+async def test_stop_uploads_pending_sync():
+    ext = whitelist(FakeProfiles())
+    await ext.request_sync()
+    assert ext._uploader.uploads == []
+    await asyncio.wait_for(ext.shutdown(), 1)
+    assert ext._uploader.uploads == [(b'[]', 'whitelist.json')]
+    assert ext._uploader.closed
+
+
+async def test_ban_locks_only_profile_owner():
+    profile = SimpleNamespace(ign='steve', uuid='uuid', user=SimpleNamespace(did=5), banned=False)
+    ext = whitelist(FakeProfiles(profile))
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    msg = SimpleNamespace(channel=SimpleNamespace(send=send))
+    # Unrelated member handler does not block ban
+    async with ext.bot.locks.user(6):
+        await asyncio.wait_for(ext.cmd_handler('wl_ban')(msg, 'mc/', ['wl-ban', 'steve']), 1)
+    assert profile.banned
+    # Owner handler does
+    async with ext.bot.locks.user(5):
+        unban = asyncio.ensure_future(ext.cmd_handler('wl_unban')(msg, 'mc/', ['wl-unban', 'steve']))
+        await asyncio.sleep(0.01)
+        assert not unban.done() and profile.banned
+    await asyncio.wait_for(unban, 1)
+    assert not profile.banned
+    assert len(sent) == 2
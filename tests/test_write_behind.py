@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MIT License
+
+Copyright (c) 2021-present Daniel [Mathtin] Shiko <wdaniil@mail.ru>
+Project: Minecraft Discord Bot
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__author__ = "Mathtin"
+
+import asyncio
+
+from sqlalchemy import select
+
+import db as DB
+from services.service import WriteBehindQueue
+
+
+def cache_row(name: str):
+    return {'name': name, 'ign': name, 'uuid': None, 'expires_at': 0}
+
+
+def cached_names(db):
+    with db.sync_session() as session:
+        return sorted(session.execute(select(DB.PlayerNameCache.name)).scalars().all())
+
+
+async def test_timed_flush_writes_pending(db):
+    queue = WriteBehindQueue(db, max_size=100, max_delay=0.05)
+    await queue.upsert(DB.PlayerNameCache, cache_row('alice'), 'name')
+    await queue.upsert(DB.PlayerNameCache, cache_row('bob'), 'name')
+    assert cached_names(db) == []
+    await asyncio.sleep(0.2)
+    assert cached_names(db) == ['alice', 'bob']
+    assert queue.flushes == 1
+
+
+async def test_failed_timed_flush_is_retried(db):
+    queue = WriteBehindQueue(db, max_size=100, max_delay=0.05)
+    write = queue._write
+    failures = []
+
+    async def flaky_write(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(args[1])
+            raise IOError('database is gone')
+        return await write(*args, **kwargs)
+
+    queue._write = flaky_write
+    await queue.upsert(DB.PlayerNameCache, cache_row('alice'), 'name')
+    # First flush after 0.05s fails, retries follow after 0.1s and 0.2s
+    await asyncio.sleep(0.6)
+    assert len(failures) == 2
+    assert cached_names(db) == ['alice']
+    assert len(queue) == 0
+    await queue.close()